@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Benchmark collect_video_files against the previous per-extension rglob scan.
+
+Also times a rescan of the unchanged tree with a warm --incremental directory index.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rename_videos import DEFAULT_EXTENSIONS, DirectoryIndex, collect_video_files  # noqa: E402
+
+OTHER_SUFFIXES = ("jpg", "nfo", "srt", "txt")
+
+
+def collect_video_files_rglob(folder: Path, extensions: tuple[str, ...]) -> list[Path]:
+    """The original implementation: two rglob walks per extension."""
+    def gen():
+        for ext in extensions:
+            yield from folder.rglob(f"*.{ext}")
+            yield from folder.rglob(f"*.{ext.upper()}")
+
+    seen: set[Path] = set()
+    unique: list[Path] = []
+    for f in gen():
+        resolved = f.resolve()
+        if resolved not in seen:
+            seen.add(resolved)
+            unique.append(f)
+    unique.sort(key=lambda p: str(p))
+    return unique
+
+
+def build_tree(root: Path, dirs: int, files_per_dir: int, depth: int) -> int:
+    """Create a synthetic tree of empty files and return the number of video files."""
+    videos = 0
+    for d in range(dirs):
+        parts = [f"d{d % (i + 2)}_{i}" for i in range(depth)]
+        directory = root.joinpath(*parts, f"leaf{d}")
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(files_per_dir):
+            if i % 3 == 0:
+                name = f"other_{i}.{OTHER_SUFFIXES[i % len(OTHER_SUFFIXES)]}"
+            else:
+                ext = DEFAULT_EXTENSIONS[i % len(DEFAULT_EXTENSIONS)]
+                name = f"video_{i}.{ext.upper() if i % 5 == 0 else ext}"
+                videos += 1
+            (directory / name).touch()
+    return videos
+
+
+def backdate_directories(root: Path, seconds: int) -> None:
+    """Set every directory's mtime into the past so the index does not treat it as racy."""
+    stamp = time.time() - seconds
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (stamp, stamp))
+
+
+def timed(func, *args) -> tuple[float, list[Path]]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=500, help="Number of leaf directories")
+    parser.add_argument("--files", type=int, default=30, help="Files per leaf directory")
+    parser.add_argument("--depth", type=int, default=4, help="Nesting depth above each leaf")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per implementation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        tree = root / "tree"
+        videos = build_tree(tree, args.dirs, args.files, args.depth)
+        backdate_directories(tree, 60)
+        print(f"Synthetic tree: {args.dirs * args.files} files, {videos} videos")
+
+        index = DirectoryIndex(root / "dir_index.sqlite3")
+        collect_video_files(tree, DEFAULT_EXTENSIONS, index=index)
+
+        rglob_times, scandir_times, indexed_times = [], [], []
+        for _ in range(args.repeat):
+            elapsed, old = timed(collect_video_files_rglob, tree, DEFAULT_EXTENSIONS)
+            rglob_times.append(elapsed)
+            elapsed, new = timed(collect_video_files, tree, DEFAULT_EXTENSIONS)
+            scandir_times.append(elapsed)
+            elapsed, indexed = timed(lambda: collect_video_files(tree, DEFAULT_EXTENSIONS, index=index))
+            indexed_times.append(elapsed)
+            if not old == new == indexed:
+                print("Error: implementations returned different file lists", file=sys.stderr)
+                sys.exit(1)
+
+        index.close()
+
+        best_old, best_new, best_indexed = min(rglob_times), min(scandir_times), min(indexed_times)
+        print(f"rglob:   {best_old:.3f} s (best of {args.repeat})")
+        print(f"scandir: {best_new:.3f} s (best of {args.repeat})")
+        print(f"indexed: {best_indexed:.3f} s (best of {args.repeat}, unchanged tree)")
+        print(f"Speedup: {best_old / best_new:.1f}x scandir, {best_new / best_indexed:.1f}x indexed over scandir")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark inode-based de-duplication against resolving every path.
+
+Both variants walk the same deep synthetic tree with iter_video_entries; the
+old one calls Path.resolve() per match, which costs an lstat per path
+component and grows with depth.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rename_videos import DEFAULT_EXTENSIONS, iter_unique_video_files, iter_video_entries  # noqa: E402
+
+
+def unique_by_resolve(folder: Path, extensions: tuple[str, ...]) -> list[Path]:
+    """The previous approach: de-duplicate on Path.resolve()."""
+    seen: set[Path] = set()
+    unique: list[Path] = []
+    for entry in iter_video_entries(folder, extensions):
+        f = Path(entry.path)
+        resolved = f.resolve()
+        if resolved not in seen:
+            seen.add(resolved)
+            unique.append(f)
+    return unique
+
+
+def build_deep_tree(root: Path, chains: int, depth: int, files_per_dir: int, aliases: int) -> None:
+    """Create chains of nested directories depth levels deep with files at every level."""
+    for c in range(chains):
+        directory = root
+        for level in range(depth):
+            directory = directory / f"level{level}_{c}"
+            directory.mkdir()
+            for i in range(files_per_dir):
+                ext = DEFAULT_EXTENSIONS[(c + level + i) % len(DEFAULT_EXTENSIONS)]
+                (directory / f"video_{i}.{ext}").touch()
+        for a in range(aliases):
+            target = directory / f"video_0.{DEFAULT_EXTENSIONS[(c + depth - 1) % len(DEFAULT_EXTENSIONS)]}"
+            os.link(target, directory / f"hardlink_{a}{target.suffix}")
+            os.symlink(target.name, directory / f"symlink_{a}{target.suffix}")
+
+
+def best_of(repeat: int, func, *args) -> tuple[float, list[Path]]:
+    best = float("inf")
+    result: list[Path] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chains", type=int, default=50, help="Independent directory chains")
+    parser.add_argument("--depth", type=int, default=20, help="Directory levels per chain")
+    parser.add_argument("--files", type=int, default=5, help="Video files per directory")
+    parser.add_argument("--aliases", type=int, default=2, help="Hard links and symlinks added per chain")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per implementation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_deep_tree(root, args.chains, args.depth, args.files, args.aliases)
+
+        resolve_time, old = best_of(args.repeat, unique_by_resolve, root, DEFAULT_EXTENSIONS)
+        inode_time, new = best_of(args.repeat, lambda *a: list(iter_unique_video_files(*a)), root, DEFAULT_EXTENSIONS)
+
+        print(f"Deep tree: {args.chains} chains x {args.depth} levels")
+        print(f"Kept: resolve {len(old)} files, inode {len(new)} files (resolve cannot see hard links)")
+        print(f"resolve: {resolve_time:.3f} s (best of {args.repeat})")
+        print(f"inode:   {inode_time:.3f} s (best of {args.repeat})")
+        print(f"Speedup: {resolve_time / inode_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
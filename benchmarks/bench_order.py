@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Benchmark probing in path order against physical (FIEMAP) order on ext4.
+
+Builds an ext4 image, attaches it to a loop device with direct I/O (so the
+host page cache does not hide seeks), mounts it and fills it with copies of a
+sample video written in shuffled order between filler files, so that path
+order and on-disk order disagree. Then it drops each file's cached pages and
+times the built-in header parsers over all copies in both orders. Creating
+the image needs root; --mountpoint runs against an existing filesystem instead.
+
+  sudo python3 benchmarks/bench_order.py sample.mkv --files 500
+  python3 benchmarks/bench_order.py sample.mkv --mountpoint /mnt/hdd/scratch
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rename_videos import FAST_PROBES, physical_order, probe_header  # noqa: E402
+
+FILLER_CHUNK = 1024 * 1024
+
+
+@contextlib.contextmanager
+def loopback_ext4(size_mb: int) -> Iterator[Path]:
+    """Create, attach and mount an ext4 image; yield the mount point and tear it all down."""
+    with tempfile.TemporaryDirectory() as tmp:
+        image = Path(tmp) / "ext4.img"
+        mountpoint = Path(tmp) / "mnt"
+        mountpoint.mkdir()
+        with open(image, "wb") as f:
+            f.truncate(size_mb * 1024 * 1024)
+        subprocess.run(["mkfs.ext4", "-q", "-F", str(image)], check=True)
+        device = subprocess.run(
+            ["losetup", "--find", "--show", "--direct-io=on", str(image)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        try:
+            subprocess.run(["mount", device, str(mountpoint)], check=True)
+            try:
+                yield mountpoint
+            finally:
+                subprocess.run(["umount", str(mountpoint)], check=True)
+        finally:
+            subprocess.run(["losetup", "--detach", device], check=True)
+
+
+def populate(root: Path, sample: Path, files: int, filler_mb: int, seed: int) -> list[Path]:
+    """Copy sample files times in shuffled name order with filler between them; return the copies."""
+    names = [f"video_{i:05d}{sample.suffix}" for i in range(files)]
+    random.Random(seed).shuffle(names)
+    filler = b"\0" * FILLER_CHUNK
+    for i, name in enumerate(names):
+        shutil.copyfile(sample, root / name)
+        with open(root / f".filler_{i:05d}", "wb") as f:
+            for _ in range(filler_mb):
+                f.write(filler)
+    os.sync()
+    return sorted(root / name for name in names)
+
+
+def drop_caches(paths: list[Path]) -> None:
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def timed_pass(paths: list[Path]) -> tuple[float, int]:
+    """Probe every path with a cold cache; return (seconds, failures)."""
+    drop_caches(paths)
+    start = time.perf_counter()
+    failed = sum(1 for path in paths if probe_header(path) is None)
+    return time.perf_counter() - start, failed
+
+
+def run(root: Path, args: argparse.Namespace) -> None:
+    paths = populate(root, args.sample, args.files, args.filler_mb, args.seed)
+
+    start = time.perf_counter()
+    ordered = physical_order(paths)
+    sort_time = time.perf_counter() - start
+
+    by_path, by_physical = [], []
+    failed = 0
+    for _ in range(args.repeat):
+        elapsed, failed = timed_pass(paths)
+        by_path.append(elapsed)
+        elapsed, _ = timed_pass(ordered)
+        by_physical.append(elapsed)
+
+    best_path, best_physical = min(by_path), min(by_physical)
+    moved = sum(1 for a, b in zip(paths, ordered) if a != b)
+    print(f"Files: {len(paths)} copies of {args.sample.name} with {args.filler_mb} MiB filler between them")
+    print(f"Reordered: {moved} of {len(paths)} files change position in physical order")
+    if failed:
+        print(f"Warning: {failed} file(s) fell back (the parser could not read them)", file=sys.stderr)
+    print(f"path order:     {best_path:.3f} s ({len(paths) / best_path:.0f} files/s, best of {args.repeat})")
+    print(f"physical order: {best_physical:.3f} s ({len(paths) / best_physical:.0f} files/s, best of {args.repeat})")
+    print(f"sorting:        {sort_time:.3f} s (FIEMAP and stat per file)")
+    print(f"Speedup: {best_path / best_physical:.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sample", type=Path, help="Sample video with a built-in header parser")
+    parser.add_argument("--files", type=int, default=300, help="Copies of the sample")
+    parser.add_argument("--filler-mb", type=int, default=4, help="MiB of filler written after each copy")
+    parser.add_argument("--image-mb", type=int, default=None, help="Size of the ext4 image (default: fits the data)")
+    parser.add_argument("--mountpoint", type=Path, help="Use this directory instead of a loopback ext4 image")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per order")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the write order")
+    args = parser.parse_args()
+
+    if args.sample.suffix[1:].lower() not in FAST_PROBES:
+        print(f"Error: no built-in parser for {args.sample.suffix} files", file=sys.stderr)
+        sys.exit(1)
+
+    if args.mountpoint is not None:
+        with tempfile.TemporaryDirectory(dir=args.mountpoint) as tmp:
+            run(Path(tmp), args)
+        return
+
+    if os.geteuid() != 0:
+        print("Error: creating a loopback ext4 image needs root; use --mountpoint instead", file=sys.stderr)
+        sys.exit(1)
+    needed_mb = args.files * (args.sample.stat().st_size // (1024 * 1024) + 1 + args.filler_mb)
+    with loopback_ext4(args.image_mb or needed_mb * 5 // 4 + 64) as mountpoint:
+        run(mountpoint, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of rename_videos.py phases on a synthetic tree.
+
+Generates N empty video files across nested directories and runs them
+through the same functions main() uses, probing with fake_ffprobe.py, and
+times each phase separately: collect, probe, plan, print and apply. The JSON
+report can be saved and compared against a run from another commit:
+
+  python3 benchmarks/bench_pipeline.py --files 5000 --output before.json
+  python3 benchmarks/bench_pipeline.py --files 5000 --compare before.json
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+import rename_videos  # noqa: E402
+from rename_videos import (  # noqa: E402
+    ASYNC_DEFAULT_JOBS,
+    DEFAULT_EXTENSIONS,
+    RenameJournal,
+    apply_renames,
+    collect_video_files,
+    order_renames,
+    print_plan,
+    probe_file_entry,
+    probe_file_entry_async,
+    resolve_collisions,
+    run_async,
+    run_threaded,
+)
+
+FAKE_FFPROBE = Path(__file__).resolve().parent / "fake_ffprobe.py"
+PHASES = ("collect", "probe", "plan", "print", "apply")
+
+
+def build_tree(root: Path, files: int, depth: int, fanout: int) -> None:
+    """Create files spread over a directory tree depth levels deep with fanout subdirectories per level."""
+    for i in range(files):
+        parts = []
+        n = i
+        for _ in range(depth):
+            parts.append(f"dir{n % fanout}")
+            n //= fanout
+        directory = root.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        ext = DEFAULT_EXTENSIONS[i % len(DEFAULT_EXTENSIONS)]
+        if i % 10 == 0:
+            name = f"movie_{i}_{i % 150}分钟.{ext}"
+        elif i % 10 == 1:
+            name = f"movie_{i}_{i % 150}min_1280x720.{ext}"
+        else:
+            name = f"movie_{i}.{ext}"
+        (directory / name).touch()
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(REPO), "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_once(args: argparse.Namespace) -> tuple[dict[str, float], dict[str, int]]:
+    """Build a fresh tree, run every phase once and return (timings, counts)."""
+    timings: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "videos"
+        build_tree(root, args.files, args.depth, args.fanout)
+        fast = not args.ffprobe_only
+
+        start = time.perf_counter()
+        files = collect_video_files(root, DEFAULT_EXTENSIONS)
+        timings["collect"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if args.engine == "async":
+            probe = functools.partial(probe_file_entry_async, str(FAKE_FFPROBE), fast=fast)
+            results = run_async(files, probe, args.jobs or ASYNC_DEFAULT_JOBS, per_device=args.per_device_jobs)
+        else:
+            probe = functools.partial(probe_file_entry, str(FAKE_FFPROBE), fast=fast)
+            results = run_threaded(files, probe, args.jobs, per_device=args.per_device_jobs)
+        timings["probe"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plan = resolve_collisions(sorted((entry for entry, _ in results), key=lambda p: str(p[0])))
+        steps = order_renames(plan)
+        timings["plan"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            print_plan(plan)
+        timings["print"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            journal = RenameJournal.create(Path(tmp) / "journal.jsonl", steps)
+            renamed, failed = apply_renames(steps, journal)
+        timings["apply"] = time.perf_counter() - start
+
+    counts = {
+        "files": len(files),
+        "probe_failed": sum(1 for _, _, s in plan if s == "SKIP (probe failed)"),
+        "renamed": renamed,
+        "rename_failed": failed,
+    }
+    return timings, counts
+
+
+def compare(report: dict, baseline: dict) -> None:
+    print(f"\n{'PHASE':<10} {'BASELINE':>10} {'CURRENT':>10} {'CHANGE':>8}")
+    for phase in PHASES:
+        old = baseline["phases"].get(phase)
+        new = report["phases"][phase]
+        if old is None:
+            print(f"{phase:<10} {'-':>10} {new:>9.3f}s {'':>8}")
+            continue
+        change = (new - old) / old * 100 if old > 0 else 0.0
+        print(f"{phase:<10} {old:>9.3f}s {new:>9.3f}s {change:>+7.1f}%")
+    if baseline.get("config") != report["config"]:
+        print("\nWarning: baseline was run with a different configuration", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000, help="Number of synthetic video files")
+    parser.add_argument("--depth", type=int, default=3, help="Directory nesting depth")
+    parser.add_argument("--fanout", type=int, default=8, help="Subdirectories per level")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake ffprobe latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Fake ffprobe latency jitter as a fraction")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of probes that fail")
+    parser.add_argument("--engine", choices=("thread", "async"), default="thread", help="Probe engine")
+    parser.add_argument("--jobs", type=int, default=None, help="Maximum probes in flight")
+    parser.add_argument("--per-device-jobs", type=int, default=None, help="Maximum probes in flight per disk")
+    parser.add_argument("--ffprobe-only", action="store_true", help="Skip the built-in header parsers")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs on fresh trees; the best time per phase is reported")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", type=Path, metavar="BASELINE", help="Compare with a saved JSON report")
+    args = parser.parse_args()
+
+    os.environ["FAKE_FFPROBE_LATENCY"] = str(args.latency)
+    os.environ["FAKE_FFPROBE_JITTER"] = str(args.jitter)
+    os.environ["FAKE_FFPROBE_FAILURE_RATE"] = str(args.failure_rate)
+
+    samples: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    counts: dict[str, int] = {}
+    for _ in range(args.repeat):
+        timings, counts = run_once(args)
+        for phase in PHASES:
+            samples[phase].append(timings[phase])
+
+    config = {
+        key: getattr(args, key)
+        for key in (
+            "files", "depth", "fanout", "latency", "jitter", "failure_rate",
+            "engine", "jobs", "per_device_jobs", "ffprobe_only",
+        )
+    }
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "module": str(Path(rename_videos.__file__).resolve()),
+        "config": config,
+        "counts": counts,
+        "phases": {phase: min(values) for phase, values in samples.items()},
+        "samples": samples,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
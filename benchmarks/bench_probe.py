@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Benchmark the in-process container header parsers against ffprobe.
+
+Runs every file under the given folder that has a built-in parser through both
+the parser and probe_video, and reports files per second for each path along
+with any files where the two disagree.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rename_videos import FAST_PROBES, check_ffprobe, collect_video_files, probe_video  # noqa: E402
+
+
+def rate(count: int, elapsed: float) -> str:
+    return f"{count / elapsed:9.1f} files/s" if elapsed > 0 else "      n/a"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", type=Path, help="Folder of sample videos")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per path")
+    args = parser.parse_args()
+
+    ffprobe_path = check_ffprobe()
+    files = collect_video_files(args.folder.resolve(), tuple(FAST_PROBES))
+    if not files:
+        print("No files with a built-in parser found.")
+        return
+
+    by_ext: dict[str, list[Path]] = {}
+    for f in files:
+        by_ext.setdefault(f.suffix[1:].lower(), []).append(f)
+
+    print(f"{'EXT':<6} {'FILES':>6} {'PARSER':>18} {'FFPROBE':>18} {'SPEEDUP':>8} {'FALLBACK':>9} {'MISMATCH':>9}")
+    for ext, paths in sorted(by_ext.items()):
+        parse = FAST_PROBES[ext]
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            parsed = [parse(p) for p in paths]
+        parser_time = (time.perf_counter() - start) / args.repeat
+
+        start = time.perf_counter()
+        probed = [probe_video(ffprobe_path, p) for p in paths]
+        ffprobe_time = time.perf_counter() - start
+
+        fallback = sum(1 for r in parsed if r is None)
+        mismatched = [p for p, a, b in zip(paths, parsed, probed) if a is not None and a != b]
+        speedup = ffprobe_time / parser_time if parser_time > 0 else float("inf")
+        print(
+            f"{ext:<6} {len(paths):>6} {rate(len(paths), parser_time):>18} "
+            f"{rate(len(paths), ffprobe_time):>18} {speedup:>7.0f}x {fallback:>9} {len(mismatched):>9}"
+        )
+        for p in mismatched:
+            print(f"  mismatch: {p}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
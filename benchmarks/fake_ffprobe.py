@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Stand-in for ffprobe with configurable latency and failure rate.
+
+Accepts the command line rename_videos.py passes to ffprobe and prints the same
+key=value output. Results are derived from a hash of the file path, so repeated
+runs over the same tree are reproducible. Configured through the environment:
+
+  FAKE_FFPROBE_LATENCY       seconds to sleep per call (default: 0.05)
+  FAKE_FFPROBE_JITTER        +/- fraction of the latency, per file (default: 0)
+  FAKE_FFPROBE_FAILURE_RATE  fraction of files that fail to probe (default: 0)
+"""
+
+import os
+import sys
+import time
+import zlib
+
+RESOLUTIONS = ((1920, 1080), (1280, 720), (720, 404), (3840, 2160), (640, 360))
+
+
+def main() -> None:
+    filepath = sys.argv[-1]
+    digest = zlib.crc32(os.fsencode(filepath))
+    fraction = (digest % 10_000) / 10_000
+
+    latency = float(os.environ.get("FAKE_FFPROBE_LATENCY", "0.05"))
+    jitter = float(os.environ.get("FAKE_FFPROBE_JITTER", "0"))
+    failure_rate = float(os.environ.get("FAKE_FFPROBE_FAILURE_RATE", "0"))
+
+    time.sleep(max(0.0, latency * (1 + jitter * (2 * fraction - 1))))
+
+    if fraction < failure_rate or not os.path.exists(filepath):
+        print(f"{filepath}: Invalid data found when processing input", file=sys.stderr)
+        sys.exit(1)
+
+    width, height = RESOLUTIONS[digest % len(RESOLUTIONS)]
+    print(f"width={width}")
+    print(f"height={height}")
+    print(f"duration={60 + digest % 7200}.000000")
+
+
+if __name__ == "__main__":
+    main()
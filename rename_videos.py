@@ -2,114 +2,2770 @@
 """Scan a video folder, detect duration and resolution via ffprobe, and rename files."""
 
 import argparse
+import asyncio
+import contextlib
+import csv
+import ctypes
+import ctypes.util
+import errno
+import functools
+import itertools
+import json
+import math
 import os
 import re
+import select
 import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from itertools import chain
+import uuid
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import BinaryIO, TextIO, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 DEFAULT_EXTENSIONS = ("mp4", "mkv", "avi", "mov", "wmv", "flv", "webm", "ts", "m4v")
 
-ALREADY_TAGGED_RE = re.compile(r"_\d+min_\d+x\d+$")
-CHINESE_DURATION_RE = re.compile(r"\d+分钟")
-TRAILING_RESOLUTION_RE = re.compile(r"_(\d+x\d+)$")
+ALREADY_TAGGED_RE = re.compile(r"_\d+min_\d+x\d+$")
+CHINESE_DURATION_RE = re.compile(r"\d+分钟")
+TRAILING_RESOLUTION_RE = re.compile(r"_(\d+x\d+)$")
+
+R = TypeVar("R")
+
+FFPROBE_TIMEOUT = 30
+ASYNC_DEFAULT_JOBS = 64
+QUEUE_PER_JOB = 4
+JOURNAL_BATCH = 500
+PLAN_FILE_VERSION = 1
+PROGRESS_INTERVAL = 0.5
+PROGRESS_WINDOW = 1000
+WATCH_DEBOUNCE = 5.0
+DEVICE_LOOKAHEAD = 10_000
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQIIII")
+FIEMAP_EXTENT = struct.Struct("=QQQ2QI3I")
+ADAPTIVE_INITIAL_JOBS = 4
+ADAPTIVE_MAX_JOBS = 128
+ADAPTIVE_INTERVAL = 1.0
+ADAPTIVE_MIN_SAMPLES = 8
+ADAPTIVE_GAIN = 0.05
+ADAPTIVE_BACKOFF = 0.7
+TRUST_NAMES = ("off", "tagged", "resolution")
+XATTR_SIZE = "user.videoname.size"
+XATTR_MTIME = "user.videoname.mtime"
+XATTR_DURATION = "user.videoname.duration"
+XATTR_WIDTH = "user.videoname.width"
+XATTR_HEIGHT = "user.videoname.height"
+# Rename stamp ("SIZE MTIME_NS"), kept apart from the probe results above so a
+# probe alone never makes a file look renamed by this tool.
+XATTR_RENAMED = "user.videoname.renamed"
+STAMP_SIDECAR = ".videoname.json"
+
+# inotify(7) constants.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def check_ffprobe() -> str:
+    """Return the path to ffprobe, or exit with an error message."""
+    path = shutil.which("ffprobe")
+    if path is None:
+        print("Error: ffprobe not found. Install it with: sudo apt install ffmpeg", file=sys.stderr)
+        sys.exit(1)
+    return path
+
+
+def ffprobe_command(ffprobe_path: str, filepath: Path) -> list[str]:
+    """Return the ffprobe command line that reports duration and video size."""
+    return [
+        ffprobe_path,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1",
+        str(filepath),
+    ]
+
+
+def parse_ffprobe_output(output: str) -> tuple[int, int, int] | None:
+    """Parse ffprobe key=value output into (duration_min, width, height), or None."""
+    lines = output.strip().split("\n")
+    values = {}
+    for line in lines:
+        if "=" in line:
+            key, val = line.split("=", 1)
+            values[key] = val
+
+    try:
+        width = int(values.get("width", 0))
+        height = int(values.get("height", 0))
+        seconds = float(values.get("duration", 0))
+    except ValueError:
+        return None
+
+    if width <= 0 or height <= 0:
+        return None
+
+    duration_min = max(1, round(seconds / 60))
+    return (duration_min, width, height)
+
+
+def probe_video(ffprobe_path: str, filepath: Path) -> tuple[int, int, int] | None:
+    """Probe a video file and return (duration_min, width, height), or None on failure."""
+    try:
+        result = subprocess.run(
+            ffprobe_command(ffprobe_path, filepath),
+            capture_output=True,
+            text=True,
+            timeout=FFPROBE_TIMEOUT,
+        )
+        if result.returncode != 0:
+            return None
+        return parse_ffprobe_output(result.stdout)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+
+
+async def probe_video_async(ffprobe_path: str, filepath: Path) -> tuple[int, int, int] | None:
+    """Asyncio counterpart of probe_video; kills ffprobe if it exceeds the timeout."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *ffprobe_command(ffprobe_path, filepath),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), FFPROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0:
+        return None
+    return parse_ffprobe_output(stdout.decode(errors="replace"))
+
+
+def _read_box_header(f: BinaryIO, offset: int, end: int) -> tuple[bytes, int, int] | None:
+    """Read an ISO-BMFF box header at offset; return (type, payload_offset, box_end)."""
+    if offset + 8 > end:
+        return None
+    f.seek(offset)
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack(">I4s", header)
+    payload = offset + 8
+    if size == 1:
+        large = f.read(8)
+        if len(large) < 8:
+            return None
+        size = struct.unpack(">Q", large)[0]
+        payload += 8
+    elif size == 0:
+        size = end - offset
+    if size < payload - offset or offset + size > end:
+        return None
+    return (box_type, payload, offset + size)
+
+
+def _iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Yield (type, payload_offset, box_end) for the boxes between start and end."""
+    offset = start
+    while True:
+        header = _read_box_header(f, offset, end)
+        if header is None:
+            return
+        yield header
+        offset = header[2]
+
+
+def _find_box(f: BinaryIO, start: int, end: int, box_type: bytes) -> tuple[int, int] | None:
+    """Return (payload_offset, box_end) of the first child box of the given type."""
+    for found, payload, box_end in _iter_boxes(f, start, end):
+        if found == box_type:
+            return (payload, box_end)
+    return None
+
+
+def _mp4_video_size(f: BinaryIO, trak_start: int, trak_end: int) -> tuple[int, int] | None:
+    """Return (width, height) if the trak is a video track, else None."""
+    mdia = _find_box(f, trak_start, trak_end, b"mdia")
+    if mdia is None:
+        return None
+    hdlr = _find_box(f, *mdia, b"hdlr")
+    if hdlr is None:
+        return None
+    f.seek(hdlr[0] + 8)
+    if f.read(4) != b"vide":
+        return None
+
+    # The sample entry holds the coded size that ffprobe reports; tkhd holds the
+    # display size and is only used when no sample description is present.
+    minf = _find_box(f, *mdia, b"minf")
+    stbl = _find_box(f, *minf, b"stbl") if minf else None
+    stsd = _find_box(f, *stbl, b"stsd") if stbl else None
+    if stsd is not None:
+        entry = _read_box_header(f, stsd[0] + 8, stsd[1])
+        if entry is not None and entry[1] + 28 <= entry[2]:
+            f.seek(entry[1] + 24)
+            width, height = struct.unpack(">HH", f.read(4))
+            if width > 0 and height > 0:
+                return (width, height)
+
+    tkhd = _find_box(f, trak_start, trak_end, b"tkhd")
+    if tkhd is None:
+        return None
+    f.seek(tkhd[0])
+    version = f.read(1)[0]
+    f.seek(tkhd[0] + (88 if version == 1 else 76))
+    width, height = struct.unpack(">II", f.read(8))
+    return (width >> 16, height >> 16)
+
+
+def probe_mp4(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from an MP4/MOV moov box, or None if unsure."""
+    with open(filepath, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        moov = _find_box(f, 0, end, b"moov")
+        if moov is None:
+            return None
+
+        mvhd = _find_box(f, *moov, b"mvhd")
+        if mvhd is None:
+            return None
+        f.seek(mvhd[0])
+        version = f.read(1)[0]
+        if version == 1:
+            f.seek(mvhd[0] + 20)
+            timescale, duration = struct.unpack(">IQ", f.read(12))
+            unknown = 0xFFFFFFFFFFFFFFFF
+        else:
+            f.seek(mvhd[0] + 12)
+            timescale, duration = struct.unpack(">II", f.read(8))
+            unknown = 0xFFFFFFFF
+        if timescale == 0 or duration in (0, unknown):
+            return None
+
+        for box_type, payload, box_end in _iter_boxes(f, *moov):
+            if box_type != b"trak":
+                continue
+            size = _mp4_video_size(f, payload, box_end)
+            if size is None:
+                continue
+            width, height = size
+            if width <= 0 or height <= 0:
+                return None
+            duration_min = max(1, round(duration / timescale / 60))
+            return (duration_min, width, height)
+    return None
+
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_SEEKHEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+MKV_TRACK_TYPE_VIDEO = 1
+
+
+def _read_ebml_vint(f: BinaryIO, keep_marker: bool) -> tuple[int, int] | None:
+    """Read an EBML variable-length integer; return (value, length) or None at EOF."""
+    first = f.read(1)
+    if not first:
+        return None
+    length = 9 - first[0].bit_length()
+    if length > 8:
+        return None
+    rest = f.read(length - 1)
+    if len(rest) < length - 1:
+        return None
+    value = int.from_bytes(first + rest, "big")
+    if not keep_marker:
+        value &= (1 << (7 * length)) - 1
+    return (value, length)
+
+
+def _iter_ebml(f: BinaryIO, start: int, end: int) -> Iterator[tuple[int, int, int | None]]:
+    """Yield (element_id, data_offset, data_end) for the elements between start and end.
+
+    data_end is None for an element of unknown size, after which iteration stops.
+    """
+    offset = start
+    while offset < end:
+        f.seek(offset)
+        element_id = _read_ebml_vint(f, keep_marker=True)
+        size = _read_ebml_vint(f, keep_marker=False)
+        if element_id is None or size is None:
+            return
+        data = offset + element_id[1] + size[1]
+        if size[0] == (1 << (7 * size[1])) - 1:
+            yield (element_id[0], data, None)
+            return
+        data_end = data + size[0]
+        if data_end > end:
+            return
+        yield (element_id[0], data, data_end)
+        offset = data_end
+
+
+def _read_ebml_uint(f: BinaryIO, data: int, data_end: int) -> int:
+    f.seek(data)
+    return int.from_bytes(f.read(data_end - data), "big")
+
+
+def _read_ebml_float(f: BinaryIO, data: int, data_end: int) -> float:
+    f.seek(data)
+    raw = f.read(data_end - data)
+    if len(raw) == 4:
+        return struct.unpack(">f", raw)[0]
+    if len(raw) == 8:
+        return struct.unpack(">d", raw)[0]
+    raise ValueError("invalid EBML float size")
+
+
+def _mkv_info_seconds(f: BinaryIO, data: int, data_end: int) -> float | None:
+    """Return the segment duration in seconds from an Info element."""
+    timecode_scale = 1_000_000
+    duration = None
+    for element_id, child, child_end in _iter_ebml(f, data, data_end):
+        if child_end is None:
+            return None
+        if element_id == MKV_TIMECODE_SCALE:
+            timecode_scale = _read_ebml_uint(f, child, child_end)
+        elif element_id == MKV_DURATION:
+            duration = _read_ebml_float(f, child, child_end)
+    if duration is None or not 0 < duration < math.inf or timecode_scale <= 0:
+        return None
+    seconds = duration * timecode_scale / 1e9
+    return seconds if math.isfinite(seconds) else None
+
+
+def _mkv_video_size(f: BinaryIO, data: int, data_end: int) -> tuple[int, int] | None:
+    """Return (PixelWidth, PixelHeight) of the first video TrackEntry in a Tracks element."""
+    for element_id, entry, entry_end in _iter_ebml(f, data, data_end):
+        if entry_end is None:
+            return None
+        if element_id != MKV_TRACK_ENTRY:
+            continue
+        track_type = None
+        video = None
+        for child_id, child, child_end in _iter_ebml(f, entry, entry_end):
+            if child_end is None:
+                return None
+            if child_id == MKV_TRACK_TYPE:
+                track_type = _read_ebml_uint(f, child, child_end)
+            elif child_id == MKV_VIDEO:
+                video = (child, child_end)
+        if track_type != MKV_TRACK_TYPE_VIDEO or video is None:
+            continue
+        width = height = 0
+        for child_id, child, child_end in _iter_ebml(f, *video):
+            if child_end is None:
+                return None
+            if child_id == MKV_PIXEL_WIDTH:
+                width = _read_ebml_uint(f, child, child_end)
+            elif child_id == MKV_PIXEL_HEIGHT:
+                height = _read_ebml_uint(f, child, child_end)
+        return (width, height)
+    return None
+
+
+def _mkv_seek_positions(f: BinaryIO, data: int, data_end: int, segment: int) -> dict[int, int]:
+    """Map top-level element IDs to absolute offsets using a SeekHead element."""
+    positions = {}
+    for element_id, seek, seek_end in _iter_ebml(f, data, data_end):
+        if seek_end is None:
+            break
+        if element_id != MKV_SEEK:
+            continue
+        target = position = None
+        for child_id, child, child_end in _iter_ebml(f, seek, seek_end):
+            if child_end is None:
+                break
+            if child_id == MKV_SEEK_ID:
+                target = _read_ebml_uint(f, child, child_end)
+            elif child_id == MKV_SEEK_POSITION:
+                position = _read_ebml_uint(f, child, child_end)
+        if target is not None and position is not None:
+            positions.setdefault(target, segment + position)
+    return positions
+
+
+def probe_matroska(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from Matroska/WebM headers, or None if unsure.
+
+    Only the Segment Info and Tracks elements are read. Clusters are never
+    entered; when Info or Tracks come after the first Cluster, the SeekHead
+    is used to jump to them.
+    """
+    with open(filepath, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        elements = _iter_ebml(f, 0, end)
+        header = next(elements, None)
+        if header is None or header[0] != EBML_HEADER or header[2] is None:
+            return None
+        doctype = None
+        for element_id, data, data_end in _iter_ebml(f, header[1], header[2]):
+            if element_id == EBML_DOCTYPE and data_end is not None:
+                f.seek(data)
+                doctype = f.read(data_end - data).rstrip(b"\0")
+        if doctype not in (b"matroska", b"webm"):
+            return None
+
+        segment = next(_iter_ebml(f, header[2], end), None)
+        if segment is None or segment[0] != MKV_SEGMENT:
+            return None
+        segment_start = segment[1]
+        segment_end = segment[2] if segment[2] is not None else end
+
+        seconds = None
+        size = None
+        positions: dict[int, int] = {}
+        for element_id, data, data_end in _iter_ebml(f, segment_start, segment_end):
+            if element_id == MKV_CLUSTER or data_end is None:
+                break
+            if element_id == MKV_SEEKHEAD and not positions:
+                positions = _mkv_seek_positions(f, data, data_end, segment_start)
+            elif element_id == MKV_INFO:
+                seconds = _mkv_info_seconds(f, data, data_end)
+            elif element_id == MKV_TRACKS:
+                size = _mkv_video_size(f, data, data_end)
+            if seconds is not None and size is not None:
+                break
+
+        for element_id in (MKV_INFO, MKV_TRACKS):
+            if (seconds if element_id == MKV_INFO else size) is not None:
+                continue
+            position = positions.get(element_id)
+            if position is None:
+                return None
+            found = next(_iter_ebml(f, position, segment_end), None)
+            if found is None or found[0] != element_id or found[2] is None:
+                return None
+            if element_id == MKV_INFO:
+                seconds = _mkv_info_seconds(f, found[1], found[2])
+            else:
+                size = _mkv_video_size(f, found[1], found[2])
+
+    if seconds is None or size is None:
+        return None
+    width, height = size
+    if width <= 0 or height <= 0:
+        return None
+    return (max(1, round(seconds / 60)), width, height)
+
+
+AVI_HEADER_READ = 64 * 1024
+AVI_HEADER_MAX = 1024 * 1024
+
+
+def _iter_riff_chunks(data: bytes, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Yield (fourcc, payload_offset, payload_end) for the RIFF chunks in data[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        fourcc, size = struct.unpack_from("<4sI", data, offset)
+        payload = offset + 8
+        if payload + size > end:
+            return
+        yield fourcc, payload, payload + size
+        offset = payload + size + (size & 1)
+
+
+def probe_avi(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from an AVI hdrl list, or None if unsure.
+
+    The duration is the video stream's length (strh dwLength * dwScale / dwRate),
+    which covers every RIFF-AVIX part of an OpenDML file. It must agree with the
+    main header's frame count (dmlh dwTotalFrames for OpenDML files, else avih
+    dwTotalFrames) times dwMicroSecPerFrame; sizes from avih and the stream's
+    BITMAPINFOHEADER must match as well.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read(AVI_HEADER_READ)
+        if len(data) < 24 or data[:4] != b"RIFF" or data[8:12] != b"AVI ":
+            return None
+        fourcc, size, list_type = struct.unpack_from("<4sI4s", data, 12)
+        if fourcc != b"LIST" or list_type != b"hdrl" or size > AVI_HEADER_MAX:
+            return None
+        hdrl_end = 20 + size
+        if hdrl_end > len(data):
+            data += f.read(hdrl_end - len(data))
+            if hdrl_end > len(data):
+                return None
+
+    avih = None
+    total_frames = None
+    stream = None
+    for fourcc, payload, payload_end in _iter_riff_chunks(data, 24, hdrl_end):
+        if fourcc == b"avih" and payload_end - payload >= 40:
+            avih = struct.unpack_from("<IIIIIIIIII", data, payload)
+        elif fourcc == b"LIST" and data[payload : payload + 4] == b"strl" and stream is None:
+            strh = strf = None
+            for child, child_payload, child_end in _iter_riff_chunks(data, payload + 4, payload_end):
+                if child == b"strh" and child_end - child_payload >= 36:
+                    strh = struct.unpack_from("<4s4sIHHIIIII", data, child_payload)
+                elif child == b"strf" and child_end - child_payload >= 12:
+                    strf = struct.unpack_from("<Iii", data, child_payload)
+            if strh is not None and strh[0] == b"vids" and strf is not None:
+                stream = (strh, strf)
+        elif fourcc == b"LIST" and data[payload : payload + 4] == b"odml":
+            for child, child_payload, child_end in _iter_riff_chunks(data, payload + 4, payload_end):
+                if child == b"dmlh" and child_end - child_payload >= 4:
+                    (total_frames,) = struct.unpack_from("<I", data, child_payload)
+    if avih is None or stream is None:
+        return None
+
+    usec_per_frame, _, _, _, avih_frames, _, _, _, avih_width, avih_height = avih
+    strh, (_, width, height) = stream
+    scale, rate, _, length = strh[6], strh[7], strh[8], strh[9]
+    height = abs(height)
+    if rate == 0 or scale == 0 or length == 0 or width <= 0 or height == 0:
+        return None
+    if avih_width and avih_height and (avih_width, avih_height) != (width, height):
+        return None
+
+    seconds = length * scale / rate
+    frames = total_frames or avih_frames
+    if frames and usec_per_frame:
+        header_seconds = frames * usec_per_frame / 1_000_000
+        if abs(header_seconds - seconds) > max(1.0, seconds * 0.01):
+            return None
+    return (max(1, round(seconds / 60)), width, height)
+
+
+FLV_HEADER_READ = 64 * 1024
+FLV_TAG_SCRIPT = 18
+# onMetaData is written by the muxer and sometimes garbage; larger values are not trusted.
+FLV_MAX_SECONDS = 7 * 24 * 3600
+FLV_MAX_DIMENSION = 65535
+
+
+def _read_amf0(data: bytes, offset: int, depth: int = 0) -> tuple[object, int]:
+    """Decode one AMF0 value at offset and return (value, next_offset).
+
+    Objects and ECMA arrays become dicts; types a metadata tag does not need
+    raise ValueError.
+    """
+    if depth > 16:
+        raise ValueError("AMF0 nesting too deep")
+    marker = data[offset]
+    offset += 1
+    if marker == 0x00:
+        return struct.unpack_from(">d", data, offset)[0], offset + 8
+    if marker == 0x01:
+        return data[offset] != 0, offset + 1
+    if marker == 0x02:
+        (length,) = struct.unpack_from(">H", data, offset)
+        return data[offset + 2 : offset + 2 + length].decode("utf-8", "replace"), offset + 2 + length
+    if marker == 0x0C:
+        (length,) = struct.unpack_from(">I", data, offset)
+        return data[offset + 4 : offset + 4 + length].decode("utf-8", "replace"), offset + 4 + length
+    if marker in (0x05, 0x06):
+        return None, offset
+    if marker == 0x0B:
+        return struct.unpack_from(">d", data, offset)[0], offset + 10
+    if marker in (0x03, 0x08):
+        if marker == 0x08:
+            offset += 4  # The ECMA array count is advisory; the end marker is authoritative.
+        result = {}
+        while True:
+            (length,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+            if length == 0:
+                if data[offset] != 0x09:
+                    raise ValueError("missing AMF0 object end marker")
+                return result, offset + 1
+            key = data[offset : offset + length].decode("utf-8", "replace")
+            result[key], offset = _read_amf0(data, offset + length, depth + 1)
+    if marker == 0x0A:
+        (count,) = struct.unpack_from(">I", data, offset)
+        offset += 4
+        values = []
+        for _ in range(count):
+            value, offset = _read_amf0(data, offset, depth + 1)
+            values.append(value)
+        return values, offset
+    raise ValueError(f"unsupported AMF0 type {marker}")
+
+
+def probe_flv(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from an FLV onMetaData script tag, or None if unsure.
+
+    Only the tags before the first audio or video tag are examined, all within
+    the first FLV_HEADER_READ bytes.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read(FLV_HEADER_READ)
+    if len(data) < 9 or data[:3] != b"FLV" or not data[4] & 0x01:
+        return None
+    (offset,) = struct.unpack_from(">I", data, 5)
+    offset += 4  # PreviousTagSize0
+    while offset + 11 <= len(data):
+        tag_type = data[offset] & 0x1F
+        (size,) = struct.unpack(">I", b"\0" + data[offset + 1 : offset + 4])
+        payload = offset + 11
+        if tag_type != FLV_TAG_SCRIPT or payload + size > len(data):
+            return None
+        tag = data[: payload + size]
+        name, value_offset = _read_amf0(tag, payload)
+        if name == "onMetaData":
+            metadata, _ = _read_amf0(tag, value_offset)
+            if not isinstance(metadata, dict):
+                return None
+            duration, width, height = (metadata.get(key) for key in ("duration", "width", "height"))
+            if not all(isinstance(v, float) and math.isfinite(v) for v in (duration, width, height)):
+                return None
+            if not 0 < duration <= FLV_MAX_SECONDS:
+                return None
+            if not (1 <= width <= FLV_MAX_DIMENSION and 1 <= height <= FLV_MAX_DIMENSION):
+                return None
+            return (max(1, round(duration / 60)), int(width), int(height))
+        offset = payload + size + 4
+    return None
+
+
+TS_PACKET_SIZE = 188
+TS_HEAD_READ = 2 * 1024 * 1024
+TS_TAIL_READ = 1024 * 1024
+TS_STREAM_MPEG1 = 0x01
+TS_STREAM_MPEG2 = 0x02
+TS_STREAM_H264 = 0x1B
+TS_STREAM_HEVC = 0x24
+TS_TAIL_PTS = 16
+TS_CLOCK = 90_000
+TS_TIMESTAMP_WRAP = 1 << 33
+# Bounds on the average bitrate implied by size / duration; outside them the
+# timestamps most likely jumped (concatenated recordings) and ffprobe decides.
+TS_MIN_BITRATE = 16_000
+TS_MAX_BITRATE = 400_000_000
+
+
+class _BitReader:
+    """Big-endian bit reader with the Exp-Golomb codes used in parameter sets."""
+
+    def __init__(self, data: bytes) -> None:
+        self._value = int.from_bytes(data, "big")
+        self._left = len(data) * 8
+
+    def u(self, bits: int) -> int:
+        if bits > self._left:
+            raise ValueError("read past end of parameter set")
+        self._left -= bits
+        return (self._value >> self._left) & ((1 << bits) - 1)
+
+    def ue(self) -> int:
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("invalid Exp-Golomb code")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _h264_sps_size(rbsp: bytes) -> tuple[int, int]:
+    """Return the cropped (width, height) from an H.264 SPS payload (after the NAL header)."""
+    r = _BitReader(rbsp)
+    profile_idc = r.u(8)
+    r.u(16)  # constraint flags, level_idc
+    r.ue()  # seq_parameter_set_id
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format_idc = r.ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = r.u(1)
+        r.ue()  # bit_depth_luma_minus8
+        r.ue()  # bit_depth_chroma_minus8
+        r.u(1)  # qpprime_y_zero_transform_bypass_flag
+        if r.u(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if r.u(1):
+                    last = next_scale = 8
+                    for _ in range(16 if i < 6 else 64):
+                        if next_scale:
+                            next_scale = (last + r.se()) % 256
+                        last = next_scale or last
+    r.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = r.ue()
+    if pic_order_cnt_type == 0:
+        r.ue()
+    elif pic_order_cnt_type == 1:
+        r.u(1)
+        r.se()
+        r.se()
+        for _ in range(r.ue()):
+            r.se()
+    r.ue()  # max_num_ref_frames
+    r.u(1)  # gaps_in_frame_num_value_allowed_flag
+    width_mbs = r.ue() + 1
+    height_map_units = r.ue() + 1
+    frame_mbs_only = r.u(1)
+    if not frame_mbs_only:
+        r.u(1)  # mb_adaptive_frame_field_flag
+    r.u(1)  # direct_8x8_inference_flag
+    width = width_mbs * 16
+    height = (2 - frame_mbs_only) * height_map_units * 16
+    if r.u(1):  # frame_cropping_flag
+        left, right, top, bottom = r.ue(), r.ue(), r.ue(), r.ue()
+        if separate_colour_plane or chroma_format_idc == 0:
+            crop_x, crop_y = 1, 2 - frame_mbs_only
+        else:
+            crop_x = 1 if chroma_format_idc == 3 else 2
+            crop_y = (2 if chroma_format_idc == 1 else 1) * (2 - frame_mbs_only)
+        width -= crop_x * (left + right)
+        height -= crop_y * (top + bottom)
+    return (width, height)
+
+
+def _hevc_sps_size(rbsp: bytes) -> tuple[int, int]:
+    """Return the cropped (width, height) from an HEVC SPS payload (after the NAL header)."""
+    r = _BitReader(rbsp)
+    r.u(4)  # sps_video_parameter_set_id
+    max_sub_layers_minus1 = r.u(3)
+    r.u(1)  # sps_temporal_id_nesting_flag
+    r.u(88)  # general profile_tier_level fields
+    r.u(8)  # general_level_idc
+    present = [(r.u(1), r.u(1)) for _ in range(max_sub_layers_minus1)]
+    if max_sub_layers_minus1 > 0:
+        r.u(2 * (8 - max_sub_layers_minus1))
+    for profile_present, level_present in present:
+        if profile_present:
+            r.u(88)
+        if level_present:
+            r.u(8)
+    r.ue()  # sps_seq_parameter_set_id
+    chroma_format_idc = r.ue()
+    separate_colour_plane = r.u(1) if chroma_format_idc == 3 else 0
+    width = r.ue()
+    height = r.ue()
+    if r.u(1):  # conformance_window_flag
+        left, right, top, bottom = r.ue(), r.ue(), r.ue(), r.ue()
+        if separate_colour_plane or chroma_format_idc in (0, 3):
+            sub_width, sub_height = 1, 1
+        else:
+            sub_width, sub_height = 2, 2 if chroma_format_idc == 1 else 1
+        width -= sub_width * (left + right)
+        height -= sub_height * (top + bottom)
+    return (width, height)
+
+
+def _find_sps_size(es: bytes, stream_type: int) -> tuple[int, int] | None:
+    """Return the size from the first parseable SPS NAL unit in an elementary stream.
+
+    MPEG-1/2 video has no SPS; its sequence header carries the size instead.
+    """
+    if stream_type in (TS_STREAM_MPEG1, TS_STREAM_MPEG2):
+        start = es.find(b"\0\0\1\xb3")
+        if start == -1 or start + 7 > len(es):
+            return None
+        value = int.from_bytes(es[start + 4 : start + 7], "big")
+        return (value >> 12, value & 0xFFF)
+    start = es.find(b"\0\0\1")
+    while start != -1:
+        nal = start + 3
+        end = es.find(b"\0\0\1", nal)
+        if nal < len(es):
+            if stream_type == TS_STREAM_H264 and es[nal] & 0x1F == 7:
+                header = 1
+            elif stream_type == TS_STREAM_HEVC and (es[nal] >> 1) & 0x3F == 33:
+                header = 2
+            else:
+                header = 0
+            if header and end != -1:
+                rbsp = es[nal + header : end].replace(b"\0\0\3", b"\0\0")
+                try:
+                    return (stream_type == TS_STREAM_H264 and _h264_sps_size or _hevc_sps_size)(rbsp)
+                except ValueError:
+                    pass
+        start = end
+    return None
+
+
+def _iter_ts_packets(data: bytes, reverse: bool = False) -> Iterator[tuple[int, bool, bytes, bytes]]:
+    """Yield (pid, payload_unit_start, adaptation_field, payload) for each TS packet in data.
+
+    The packet grid is found by looking for five sync bytes in a row, so data
+    may start mid-packet; 192-byte M2TS packets are handled too. With reverse,
+    packets are yielded last first.
+    """
+    for stride in (TS_PACKET_SIZE, TS_PACKET_SIZE + 4):
+        for offset in range(min(stride, len(data))):
+            if all(data[offset + i * stride : offset + i * stride + 1] == b"\x47" for i in range(5)):
+                break
+        else:
+            continue
+        break
+    else:
+        return
+    offsets = range(offset, len(data) - TS_PACKET_SIZE + 1, stride)
+    for offset in reversed(offsets) if reverse else offsets:
+        if data[offset] != 0x47:
+            continue
+        pid = ((data[offset + 1] & 0x1F) << 8) | data[offset + 2]
+        control = (data[offset + 3] >> 4) & 0x3
+        payload = offset + 4
+        adaptation = b""
+        if control & 0x2:
+            length = data[offset + 4]
+            adaptation = data[offset + 5 : offset + 5 + length]
+            payload += 1 + length
+        end = offset + TS_PACKET_SIZE
+        yield pid, bool(data[offset + 1] & 0x40), adaptation, data[payload:end] if control & 0x1 else b""
+
+
+def _ts_pcr(adaptation: bytes) -> int | None:
+    """Return the 90 kHz PCR base from an adaptation field, if it carries one."""
+    if len(adaptation) < 7 or not adaptation[0] & 0x10:
+        return None
+    return int.from_bytes(adaptation[1:5], "big") << 1 | adaptation[5] >> 7
+
+
+def _pes_header(payload: bytes) -> tuple[int | None, int] | None:
+    """Return (pts, es_offset) for the start of a PES packet, or None if it is not one."""
+    if len(payload) < 9 or payload[:3] != b"\0\0\1":
+        return None
+    es_offset = 9 + payload[8]
+    if not payload[7] & 0x80 or len(payload) < 14:
+        return (None, es_offset)
+    p = payload[9:14]
+    pts = ((p[0] >> 1) & 0x7) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+    return (pts, es_offset)
+
+
+def _psi_section(payload: bytes, table_id: int) -> bytes | None:
+    """Return the body of a PSI section (after section_length, without CRC) starting in payload."""
+    if not payload:
+        return None
+    start = 1 + payload[0]
+    if len(payload) < start + 3 or payload[start] != table_id:
+        return None
+    length = ((payload[start + 1] & 0x0F) << 8) | payload[start + 2]
+    body = payload[start + 3 : start + 3 + length - 4]
+    return body if len(body) == length - 4 else None
+
+
+def _ts_last_timestamps(data: bytes, video_pid: int, pcr_pid: int) -> tuple[list[int], int | None]:
+    """Return the last TS_TAIL_PTS video PTS values and the last PCR in data.
+
+    Packets are read from the end, and reading stops once enough PTS values
+    are found, so a large tail window costs little when timestamps are dense.
+    """
+    pts_values: list[int] = []
+    last_pcr = None
+    for pid, unit_start, adaptation, payload in _iter_ts_packets(data, reverse=True):
+        if pid == pcr_pid and last_pcr is None:
+            last_pcr = _ts_pcr(adaptation)
+        if pid == video_pid and unit_start:
+            header = _pes_header(payload)
+            if header is not None and header[0] is not None:
+                pts_values.append(header[0])
+                if len(pts_values) >= TS_TAIL_PTS and last_pcr is not None:
+                    break
+    return pts_values, last_pcr
+
+
+def probe_mpegts(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from the head and tail of an MPEG-TS file, or None if unsure.
+
+    The PAT and PMT in the first TS_HEAD_READ bytes locate the H.264, HEVC or
+    MPEG-2 video stream, whose first SPS (or sequence header) gives the size.
+    The duration is the span from the first video PTS in the head to the
+    largest of the last PTS values in the final TS_TAIL_READ bytes, or between
+    PCRs when PTS values are missing.
+    """
+    with open(filepath, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        head = f.read(TS_HEAD_READ)
+        if size > len(head):
+            f.seek(max(len(head), size - TS_TAIL_READ))
+            tail = f.read(TS_TAIL_READ)
+        else:
+            tail = head
+
+    pmt_pid = None
+    video_pid = pcr_pid = stream_type = None
+    first_pts = first_pcr = None
+    dimensions = None
+    es = bytearray()
+    for pid, unit_start, adaptation, payload in _iter_ts_packets(head):
+        if pid == 0 and pmt_pid is None and unit_start:
+            body = _psi_section(payload, 0x00)
+            for i in range(5, len(body or b"") - 3, 4):
+                program = int.from_bytes(body[i : i + 2], "big")
+                if program != 0:
+                    pmt_pid = int.from_bytes(body[i + 2 : i + 4], "big") & 0x1FFF
+                    break
+        elif pid == pmt_pid and video_pid is None and unit_start:
+            body = _psi_section(payload, 0x02)
+            if body is None or len(body) < 9:
+                continue
+            pcr_pid = int.from_bytes(body[5:7], "big") & 0x1FFF
+            i = 9 + (int.from_bytes(body[7:9], "big") & 0x0FFF)
+            while i + 5 <= len(body):
+                kind = body[i]
+                es_pid = int.from_bytes(body[i + 1 : i + 3], "big") & 0x1FFF
+                if kind in (TS_STREAM_MPEG1, TS_STREAM_MPEG2, TS_STREAM_H264, TS_STREAM_HEVC):
+                    video_pid, stream_type = es_pid, kind
+                    break
+                i += 5 + (int.from_bytes(body[i + 3 : i + 5], "big") & 0x0FFF)
+            if video_pid is None:
+                return None
+            continue
+        if pid == pcr_pid and first_pcr is None:
+            first_pcr = _ts_pcr(adaptation)
+        if pid != video_pid:
+            continue
+        if unit_start:
+            header = _pes_header(payload)
+            if header is None:
+                continue
+            if first_pts is None:
+                first_pts = header[0]
+            es.clear()
+            payload = payload[header[1] :]
+        elif not es:
+            continue
+        if dimensions is None:
+            es += payload
+            dimensions = _find_sps_size(bytes(es), stream_type)
+        if dimensions is not None and first_pts is not None:
+            break
+    if video_pid is None or dimensions is None or dimensions[0] <= 0 or dimensions[1] <= 0:
+        return None
+
+    tail_pts, last_pcr = _ts_last_timestamps(tail, video_pid, pcr_pid)
+    if first_pts is not None and tail_pts:
+        first, last = first_pts, tail_pts
+    elif first_pcr is not None and last_pcr is not None:
+        first, last = first_pcr, [last_pcr]
+    else:
+        return None
+    # Differences modulo 2**33 survive one timestamp wraparound; with B-frames
+    # the largest of the final PTS values, not the last one, ends the stream.
+    seconds = max((t - first) % TS_TIMESTAMP_WRAP for t in last) / TS_CLOCK
+    if seconds <= 0 or not TS_MIN_BITRATE <= size * 8 / seconds <= TS_MAX_BITRATE:
+        return None
+    return (max(1, round(seconds / 60)), *dimensions)
+
+
+ASF_HEADER = uuid.UUID("75B22630-668E-11CF-A6D9-00AA0062CE6C").bytes_le
+ASF_FILE_PROPERTIES = uuid.UUID("8CABDCA1-A947-11CF-8EE4-00C00C205365").bytes_le
+ASF_STREAM_PROPERTIES = uuid.UUID("B7DC0791-A9B7-11CF-8EE6-00C00C205365").bytes_le
+ASF_VIDEO_MEDIA = uuid.UUID("BC19EFC0-5B4D-11CF-A8FD-00805F5C442B").bytes_le
+ASF_HEADER_MAX = 1024 * 1024
+ASF_BROADCAST = 0x1
+
+
+def probe_asf(filepath: Path) -> tuple[int, int, int] | None:
+    """Read (duration_min, width, height) from an ASF/WMV Header Object, or None if unsure.
+
+    The duration is the File Properties play duration less the preroll, as
+    ffprobe computes it; the size is the first video stream's BITMAPINFOHEADER.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read(30)
+        if len(data) < 30 or data[:16] != ASF_HEADER:
+            return None
+        (header_size,) = struct.unpack_from("<Q", data, 16)
+        if header_size > ASF_HEADER_MAX:
+            return None
+        data += f.read(header_size - 30)
+        if len(data) < header_size:
+            return None
+
+    seconds = None
+    size = None
+    offset = 30
+    while offset + 24 <= header_size:
+        guid = data[offset : offset + 16]
+        (object_size,) = struct.unpack_from("<Q", data, offset + 16)
+        if object_size < 24 or offset + object_size > header_size:
+            return None
+        body = offset + 24
+        if guid == ASF_FILE_PROPERTIES and object_size >= 104:
+            play_duration, _, preroll, flags = struct.unpack_from("<QQQI", data, body + 40)
+            if flags & ASF_BROADCAST:
+                return None
+            seconds = play_duration / 10_000_000 - preroll / 1000
+        elif guid == ASF_STREAM_PROPERTIES and size is None and data[body : body + 16] == ASF_VIDEO_MEDIA:
+            # Type-specific data: encoded width and height, flags, format data
+            # size, then a BITMAPINFOHEADER.
+            specific = body + 54
+            if specific + 23 <= offset + object_size:
+                width, height = struct.unpack_from("<ii", data, specific + 15)
+                size = (width, abs(height))
+        offset += object_size
+
+    if seconds is None or seconds <= 0 or size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return (max(1, round(seconds / 60)), *size)
+
+
+FAST_PROBES: dict[str, Callable[[Path], tuple[int, int, int] | None]] = {
+    "mp4": probe_mp4,
+    "m4v": probe_mp4,
+    "mov": probe_mp4,
+    "mkv": probe_matroska,
+    "webm": probe_matroska,
+    "avi": probe_avi,
+    "flv": probe_flv,
+    "ts": probe_mpegts,
+    "wmv": probe_asf,
+}
+
+
+def probe_header(filepath: Path) -> tuple[int, int, int] | None:
+    """Probe with the in-process header parser for the extension, or return None.
+
+    None means there is no parser for the extension or the parser could not
+    read the header with confidence; callers then fall back to ffprobe.
+    """
+    parser = FAST_PROBES.get(filepath.suffix[1:].lower())
+    if parser is None:
+        return None
+    try:
+        return parser(filepath)
+    except (OSError, ValueError, IndexError, OverflowError, struct.error):
+        return None
+
+
+def default_cache_path() -> Path:
+    """Return the default location of the probe cache database."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "rename_videos" / "probe_cache.sqlite3"
+
+
+class ProbeCache:
+    """On-disk cache of probe results keyed by (st_dev, st_ino, size, mtime_ns).
+
+    Entries are keyed by file identity rather than path, so a file renamed by a
+    previous run still hits. Lookups and stores are safe to call from worker threads.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe ("
+            "dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, path TEXT NOT NULL, duration_min INTEGER NOT NULL, "
+            "width INTEGER NOT NULL, height INTEGER NOT NULL, PRIMARY KEY (dev, ino))"
+        )
+        self._lock = threading.Lock()
+        self._seen: set[tuple[int, int]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, filepath: Path, st: os.stat_result) -> tuple[int, int, int] | None:
+        """Return the cached (duration_min, width, height) if the file is unchanged."""
+        with self._lock:
+            self._seen.add((st.st_dev, st.st_ino))
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, path, duration_min, width, height FROM probe "
+                "WHERE dev = ? AND ino = ?",
+                (st.st_dev, st.st_ino),
+            ).fetchone()
+            if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+                self.misses += 1
+                return None
+            if row[2] != str(filepath):
+                self._conn.execute(
+                    "UPDATE probe SET path = ? WHERE dev = ? AND ino = ?",
+                    (str(filepath), st.st_dev, st.st_ino),
+                )
+            self.hits += 1
+            return (row[3], row[4], row[5])
+
+    def put(self, filepath: Path, st: os.stat_result, result: tuple[int, int, int]) -> None:
+        """Store a probe result for the file identified by st."""
+        with self._lock:
+            self._seen.add((st.st_dev, st.st_ino))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, str(filepath), *result),
+            )
+
+    def evict_vanished(self, folder: Path) -> None:
+        """Drop entries under folder whose file no longer exists or was replaced."""
+        prefix = os.path.join(str(folder), "")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dev, ino, path FROM probe WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+            stale = []
+            for dev, ino, path in rows:
+                if (dev, ino) in self._seen:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    stale.append((dev, ino))
+                    continue
+                if (st.st_dev, st.st_ino) != (dev, ino):
+                    stale.append((dev, ino))
+            self._conn.executemany("DELETE FROM probe WHERE dev = ? AND ino = ?", stale)
+            self.evicted += len(stale)
+
+    def commit(self) -> None:
+        """Commit pending writes."""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Commit pending writes and close the database."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class XattrCache:
+    """Probe results kept on each file in user.videoname.* extended attributes.
+
+    Unlike ProbeCache this travels with the file (rsync -X, cp --preserve=xattr).
+    A result is valid while the recorded mtime (and size, when recorded) match
+    the file. Devices that reject user xattrs are remembered and skipped.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._unsupported: set[int] = set()
+        self.hits = 0
+        self.written = 0
+
+    def _failed(self, st: os.stat_result, e: OSError) -> None:
+        if e.errno in (errno.ENOTSUP, errno.EOPNOTSUPP, errno.EROFS):
+            with self._lock:
+                self._unsupported.add(st.st_dev)
+
+    def get(self, filepath: Path, st: os.stat_result) -> tuple[int, int, int] | None:
+        """Return the (duration_min, width, height) stored on the file if it is unchanged."""
+        if st.st_dev in self._unsupported:
+            return None
+        try:
+            if int(os.getxattr(filepath, XATTR_MTIME)) != st.st_mtime_ns:
+                return None
+            result = tuple(int(os.getxattr(filepath, name)) for name in (XATTR_DURATION, XATTR_WIDTH, XATTR_HEIGHT))
+            size = int(os.getxattr(filepath, XATTR_SIZE))
+        except OSError as e:
+            self._failed(st, e)
+            return None
+        except ValueError:
+            return None
+        if size != st.st_size:
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, filepath: Path, st: os.stat_result, result: tuple[int, int, int]) -> None:
+        """Store a probe result on the file identified by st."""
+        if st.st_dev in self._unsupported:
+            return
+        names = (XATTR_DURATION, XATTR_WIDTH, XATTR_HEIGHT, XATTR_SIZE, XATTR_MTIME)
+        try:
+            for name, value in zip(names, (*result, st.st_size, st.st_mtime_ns)):
+                os.setxattr(filepath, name, str(value).encode())
+        except OSError as e:
+            self._failed(st, e)
+            return
+        with self._lock:
+            self.written += 1
+
+
+def xattrs_supported() -> bool:
+    """Return True if this platform has os.getxattr and os.setxattr."""
+    return hasattr(os, "getxattr") and hasattr(os, "setxattr")
+
+
+def _probe_without_ffprobe(
+    filepath: Path, cache: ProbeCache | None, fast: bool, xattrs: XattrCache | None = None
+) -> tuple[os.stat_result | None, tuple[int, int, int] | None]:
+    """Try the cache, the file's xattrs and the header parsers; return (stat, probe_result)."""
+    st = None
+    if cache is not None or xattrs is not None:
+        try:
+            st = filepath.stat()
+        except OSError:
+            return (None, None)
+    if cache is not None:
+        probe_result = cache.get(filepath, st)
+        if probe_result is not None:
+            return (st, probe_result)
+    if xattrs is not None:
+        probe_result = xattrs.get(filepath, st)
+        if probe_result is not None:
+            if cache is not None:
+                cache.put(filepath, st, probe_result)
+            return (st, probe_result)
+    probe_result = probe_header(filepath) if fast else None
+    if probe_result is not None and st is not None:
+        _store_probe(filepath, st, probe_result, cache, xattrs)
+    return (st, probe_result)
+
+
+def _store_probe(
+    filepath: Path,
+    st: os.stat_result,
+    probe_result: tuple[int, int, int],
+    cache: ProbeCache | None,
+    xattrs: XattrCache | None,
+) -> None:
+    if cache is not None:
+        cache.put(filepath, st, probe_result)
+    if xattrs is not None:
+        xattrs.put(filepath, st, probe_result)
+
+
+def cached_probe(
+    ffprobe_path: str,
+    filepath: Path,
+    cache: ProbeCache | None,
+    fast: bool = True,
+    xattrs: XattrCache | None = None,
+) -> tuple[int, int, int] | None:
+    """Probe a video file, consulting and filling the caches when given."""
+    st, probe_result = _probe_without_ffprobe(filepath, cache, fast, xattrs)
+    if probe_result is None:
+        probe_result = probe_video(ffprobe_path, filepath)
+        if probe_result is not None and st is not None:
+            _store_probe(filepath, st, probe_result, cache, xattrs)
+    return probe_result
+
+
+async def cached_probe_async(
+    ffprobe_path: str,
+    filepath: Path,
+    cache: ProbeCache | None,
+    fast: bool = True,
+    xattrs: XattrCache | None = None,
+) -> tuple[int, int, int] | None:
+    """Asyncio counterpart of cached_probe, running ffprobe as an asyncio subprocess.
+
+    The stat, cache lookups and header parsers block on file I/O, so they run
+    on the loop's default executor; only ffprobe is awaited on the loop itself.
+    """
+    loop = asyncio.get_running_loop()
+    st, probe_result = await loop.run_in_executor(None, _probe_without_ffprobe, filepath, cache, fast, xattrs)
+    if probe_result is None:
+        probe_result = await probe_video_async(ffprobe_path, filepath)
+        if probe_result is not None and st is not None:
+            await loop.run_in_executor(None, _store_probe, filepath, st, probe_result, cache, xattrs)
+    return probe_result
+
+
+def iter_video_entries(folder: Path, extensions: tuple[str, ...]) -> Iterator[os.DirEntry]:
+    """Walk folder once with os.scandir and yield entries of files matching the extensions.
+
+    Extensions are matched case-insensitively. Symlinked directories are not
+    descended into, matching the behaviour of Path.rglob.
+    """
+    suffixes = frozenset(ext.lower() for ext in extensions)
+    stack = [os.fspath(folder)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    _, dot, ext = entry.name.rpartition(".")
+                    if dot and ext.lower() in suffixes and entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+
+
+def first_physical_offset(filepath: Path) -> int | None:
+    """Return the byte offset on disk of the file's first extent, via the FIEMAP ioctl.
+
+    Returns None where FIEMAP is unsupported (non-Linux, NFS, SMB, tmpfs) or the
+    file has no mapped extent.
+    """
+    if fcntl is None:
+        return None
+    buf = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    FIEMAP_HEADER.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, buf)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    if FIEMAP_HEADER.unpack_from(buf)[3] == 0:
+        return None
+    return FIEMAP_EXTENT.unpack_from(buf, FIEMAP_HEADER.size)[1]
+
+
+def physical_order(files: Iterable[Path]) -> list[Path]:
+    """Return files sorted by device and then by where their data starts on disk.
+
+    Files FIEMAP cannot map are ordered by st_ino after the mapped ones of the
+    same device, since inode order roughly follows allocation order on
+    ext4/XFS. Probing in this order lets an HDD sweep instead of seek.
+    """
+    keyed = []
+    for filepath in files:
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            keyed.append(((0, 1, 0), filepath))
+            continue
+        offset = first_physical_offset(filepath)
+        key = (st.st_dev, 0, offset) if offset is not None else (st.st_dev, 1, st.st_ino)
+        keyed.append((key, filepath))
+    keyed.sort(key=lambda k: k[0])
+    return [filepath for _, filepath in keyed]
+
+
+def default_index_path() -> Path:
+    """Return the default location of the directory index database."""
+    return default_cache_path().with_name("dir_index.sqlite3")
+
+
+class DirectoryIndex:
+    """On-disk index of directory listings keyed by path and directory mtime.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed in
+    it, so while it is unchanged the cached list of subdirectories and matching
+    files (with their st_dev and st_ino) can stand in for a fresh scandir.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The walk may run on the async engine's producer thread.
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, suffixes TEXT NOT NULL, "
+            "subdirs TEXT NOT NULL, files TEXT NOT NULL)"
+        )
+        # Listings of directories modified this recently may miss an entry added
+        # within the same mtime tick, so they are not stored.
+        self._racy_after = time.time_ns() - 2_000_000_000
+        self._rows: dict[str, tuple] | None = None
+        self._visited: set[str] = set()
+        self.reused = 0
+        self.listed = 0
+
+    def get(self, path: str, mtime_ns: int, suffixes: str) -> tuple[list[str], list[list]] | None:
+        """Return the cached (subdirs, files) of path if its mtime is unchanged."""
+        if self._rows is None:
+            # One query for the whole index is much cheaper than one per directory.
+            self._rows = {row[0]: row[1:] for row in self._conn.execute("SELECT * FROM dirs")}
+        self._visited.add(path)
+        row = self._rows.get(path)
+        if row is None or row[0] != mtime_ns or row[1] != suffixes:
+            self.listed += 1
+            return None
+        self.reused += 1
+        return json.loads(row[2]), json.loads(row[3])
+
+    def put(self, path: str, mtime_ns: int, suffixes: str, subdirs: list[str], files: list[list]) -> None:
+        """Store the listing of path taken at mtime_ns."""
+        if mtime_ns >= self._racy_after:
+            self._conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+            if self._rows is not None:
+                self._rows.pop(path, None)
+            return
+        row = (mtime_ns, suffixes, json.dumps(subdirs, ensure_ascii=False), json.dumps(files, ensure_ascii=False))
+        self._conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", (path, *row))
+        if self._rows is not None:
+            self._rows[path] = row
+
+    def evict_unvisited(self, folder: Path) -> None:
+        """Drop listings under folder for directories the last walk did not reach."""
+        prefix = os.path.join(str(folder), "")
+        rows = self._conn.execute(
+            "SELECT path FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+            (str(folder), len(prefix), prefix),
+        ).fetchall()
+        stale = [(path,) for (path,) in rows if path not in self._visited]
+        self._conn.executemany("DELETE FROM dirs WHERE path = ?", stale)
+
+    def close(self) -> None:
+        """Commit pending writes and close the database."""
+        self._conn.commit()
+        self._conn.close()
+
+
+def _list_directory(path: str, suffixes: frozenset[str]) -> tuple[list[str], list[list]] | None:
+    """Return (subdirectory names, [name, st_dev, st_ino] of matching files) for path.
+
+    Symlinked files are listed with st_dev and st_ino of None because their
+    target can change without touching this directory's mtime.
+    """
+    subdirs: list[str] = []
+    files: list[list] = []
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return None
+    with it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                _, dot, ext = entry.name.rpartition(".")
+                if dot and ext.lower() in suffixes and entry.is_file():
+                    if entry.is_symlink():
+                        files.append([entry.name, None, None])
+                    else:
+                        st = entry.stat()
+                        files.append([entry.name, st.st_dev, st.st_ino])
+            except OSError:
+                continue
+    return subdirs, files
+
+
+def iter_indexed_video_files(
+    folder: Path, extensions: tuple[str, ...], index: DirectoryIndex
+) -> Iterator[tuple[str, int, int]]:
+    """Walk folder like iter_video_entries, reusing index listings of unchanged directories.
+
+    Yields (path, st_dev, st_ino) per matching file. Unchanged directories cost
+    one stat instead of a scandir plus a stat per matching file.
+    """
+    suffixes = frozenset(ext.lower() for ext in extensions)
+    suffix_key = ",".join(sorted(suffixes))
+    stack = [os.fspath(folder)]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        listing = index.get(path, mtime_ns, suffix_key)
+        if listing is None:
+            listing = _list_directory(path, suffixes)
+            if listing is None:
+                continue
+            index.put(path, mtime_ns, suffix_key, *listing)
+        subdirs, files = listing
+        stack.extend(os.path.join(path, name) for name in subdirs)
+        for name, dev, ino in files:
+            filepath = os.path.join(path, name)
+            if dev is None:
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    continue
+                dev, ino = st.st_dev, st.st_ino
+            yield filepath, dev, ino
+
+
+def _iter_video_file_ids(folder: Path, extensions: tuple[str, ...]) -> Iterator[tuple[str, int, int]]:
+    """Yield (path, st_dev, st_ino) for each file iter_video_entries finds."""
+    for entry in iter_video_entries(folder, extensions):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        yield entry.path, st.st_dev, st.st_ino
+
+
+def iter_unique_video_files(
+    folder: Path,
+    extensions: tuple[str, ...],
+    on_duplicate: Callable[[Path, Path], None] | None = None,
+    index: DirectoryIndex | None = None,
+    devices: dict[Path, int] | None = None,
+) -> Iterator[Path]:
+    """Lazily yield matching video files in walk order, skipping aliases of files already seen.
+
+    Files are identified by (st_dev, st_ino) from the walker's DirEntry, so hard
+    links and symlinks to a file already yielded are recognised without resolving
+    every path. Each such alias is passed to on_duplicate with the path it
+    duplicates. Filesystems that report no inode numbers fall back to Path.resolve().
+    With an index, unchanged directories are not listed again. When devices is
+    given, the st_dev of each yielded path is stored in it under the path.
+    """
+    if index is None:
+        files = _iter_video_file_ids(folder, extensions)
+    else:
+        files = iter_indexed_video_files(folder, extensions, index)
+    seen: dict[tuple[int, int] | Path, Path] = {}
+    for path, dev, ino in files:
+        f = Path(path)
+        key: tuple[int, int] | Path = (dev, ino) if ino else f.resolve()
+        original = seen.get(key)
+        if original is None:
+            seen[key] = f
+            if devices is not None:
+                devices[f] = dev
+            yield f
+        elif on_duplicate is not None:
+            on_duplicate(f, original)
+
+
+def collect_video_files(
+    folder: Path,
+    extensions: tuple[str, ...],
+    on_duplicate: Callable[[Path, Path], None] | None = None,
+    index: DirectoryIndex | None = None,
+) -> list[Path]:
+    """Recursively collect video files matching the given extensions."""
+    return sorted(iter_unique_video_files(folder, extensions, on_duplicate, index), key=lambda p: str(p))
+
+
+def build_new_path(filepath: Path, duration_min: int, width: int, height: int) -> Path:
+    """Build a new path with duration and resolution."""
+    stem = filepath.stem
+    
+    stem = CHINESE_DURATION_RE.sub(f"{duration_min}min", stem)
+    
+    if TRAILING_RESOLUTION_RE.search(stem):
+        stem = TRAILING_RESOLUTION_RE.sub(f"_{width}x{height}", stem)
+    else:
+        stem = f"{stem}_{width}x{height}"
+    
+    return filepath.with_stem(stem)
+
+
+def plan_entry(
+    filepath: Path, probe_result: tuple[int, int, int] | None
+) -> tuple[Path, Path | None, str]:
+    """Turn a probe result into a (old_path, new_path, status) plan entry."""
+    if probe_result is None:
+        return (filepath, None, "SKIP (probe failed)")
+
+    duration_min, width, height = probe_result
+    new_path = build_new_path(filepath, duration_min, width, height)
+
+    if new_path == filepath:
+        return (filepath, None, "SKIP (already named)")
+    return (filepath, new_path, "RENAME")
+
+
+class PlanRecordWriter:
+    """Streams plan records to a text stream as NDJSON or CSV.
+
+    A "probe" record is written as soon as a file has been probed. When the
+    planning pass later changes an entry's status (e.g. to a collision), a
+    "plan" record for the same old path follows; the last record for a path
+    is authoritative. Each record is flushed so consumers can read the stream
+    incrementally.
+    """
+
+    FIELDS = ("event", "old", "new", "status", "duration_min", "width", "height", "probe_seconds")
+
+    def __init__(self, stream: TextIO, fmt: str) -> None:
+        self._stream = stream
+        self._csv = csv.writer(stream, lineterminator="\n") if fmt == "csv" else None
+        if self._csv is not None:
+            self._csv.writerow(self.FIELDS)
+
+    def write(
+        self,
+        event: str,
+        entry: tuple[Path, Path | None, str],
+        probe_result: tuple[int, int, int] | None = None,
+        seconds: float | None = None,
+    ) -> None:
+        old_path, new_path, status = entry
+        duration_min, width, height = probe_result or (None, None, None)
+        values = (
+            event,
+            str(old_path),
+            str(new_path) if new_path is not None else None,
+            status,
+            duration_min,
+            width,
+            height,
+            round(seconds, 4) if seconds is not None else None,
+        )
+        if self._csv is not None:
+            self._csv.writerow("" if v is None else v for v in values)
+        else:
+            self._stream.write(json.dumps(dict(zip(self.FIELDS, values)), ensure_ascii=False) + "\n")
+        self._stream.flush()
+
+
+def _name_key(path: Path) -> tuple[str, str]:
+    """Key under which a path can clash with another, ignoring case."""
+    return (str(path.parent), path.name.casefold())
+
+
+def _read_sidecar(path: Path) -> dict[str, list[int]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return stamps if isinstance(stamps, dict) else {}
+
+
+@functools.lru_cache(maxsize=1024)
+def _sidecar_stamps(directory: Path) -> dict[str, list[int]]:
+    """Return the sidecar stamps of a directory, read once per run."""
+    return _read_sidecar(directory / STAMP_SIDECAR)
+
+
+def write_name_stamps(paths: list[Path], sidecar: bool = False) -> None:
+    """Record the size and mtime of files this tool just renamed.
+
+    The stamp goes into the XATTR_RENAMED extended attribute, which follows the
+    file through renames and rsync -X. Where xattrs are unsupported and sidecar
+    is set, it goes into a per-directory STAMP_SIDECAR JSON file instead.
+    """
+    fallback: dict[Path, dict[str, list[int]]] = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        try:
+            os.setxattr(path, XATTR_RENAMED, f"{st.st_size} {st.st_mtime_ns}".encode())
+        except (OSError, AttributeError):
+            if sidecar:
+                fallback.setdefault(path.parent, {})[path.name] = [st.st_size, st.st_mtime_ns]
+    for directory, stamps in fallback.items():
+        sidecar_path = directory / STAMP_SIDECAR
+        merged = _read_sidecar(sidecar_path)
+        merged.update(stamps)
+        tmp = sidecar_path.with_name(f"{STAMP_SIDECAR}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False)
+            os.replace(tmp, sidecar_path)
+        except OSError as e:
+            print(f"Warning: cannot write {sidecar_path}: {e}", file=sys.stderr)
+    if fallback:
+        _sidecar_stamps.cache_clear()
+
+
+def clear_name_stamps(paths: list[Path]) -> None:
+    """Remove the rename stamps of files whose rename was reverted."""
+    for path in paths:
+        try:
+            os.removexattr(path, XATTR_RENAMED)
+        except (OSError, AttributeError):
+            pass
+
+
+def name_is_stamped(filepath: Path) -> bool:
+    """Return True if filepath carries a rename stamp matching its current size and mtime."""
+    try:
+        st = filepath.stat()
+    except OSError:
+        return False
+    try:
+        stamp = [int(value) for value in os.getxattr(filepath, XATTR_RENAMED).split()]
+    except (OSError, AttributeError, ValueError):
+        stamp = _sidecar_stamps(filepath.parent).get(filepath.name)
+    return stamp == [st.st_size, st.st_mtime_ns]
+
+
+def trusted_name(filepath: Path, trust: str) -> bool:
+    """Return True if the --trust-names policy lets filepath skip probing.
+
+    "tagged" trusts names ending in _WIDTHxHEIGHT that this tool gave the file,
+    as shown by a rename stamp that still matches; "resolution" trusts any
+    name ending in _WIDTHxHEIGHT. Names that still carry a Chinese duration
+    label are never trusted, since replacing it needs the probed duration.
+    """
+    if trust == "off" or not TRAILING_RESOLUTION_RE.search(filepath.stem):
+        return False
+    if CHINESE_DURATION_RE.search(filepath.stem):
+        return False
+    if trust == "resolution":
+        return True
+    return name_is_stamped(filepath)
+
+
+def probe_file_entry(
+    ffprobe_path: str,
+    filepath: Path,
+    cache: ProbeCache | None = None,
+    fast: bool = True,
+    trust: str = "off",
+    xattrs: XattrCache | None = None,
+) -> tuple[tuple[Path, Path | None, str], tuple[int, int, int] | None]:
+    """Probe one file and return (plan entry, probe result), skipping files already tagged.
+
+    Files whose name the trust policy accepts are not probed and come back
+    as already named.
+    """
+    if ALREADY_TAGGED_RE.search(filepath.stem):
+        return ((filepath, None, "SKIP (already tagged)"), None)
+    if trusted_name(filepath, trust):
+        return ((filepath, None, "SKIP (already named)"), None)
+    probe_result = cached_probe(ffprobe_path, filepath, cache, fast, xattrs)
+    return (plan_entry(filepath, probe_result), probe_result)
+
+
+async def probe_file_entry_async(
+    ffprobe_path: str,
+    filepath: Path,
+    cache: ProbeCache | None = None,
+    fast: bool = True,
+    trust: str = "off",
+    xattrs: XattrCache | None = None,
+) -> tuple[tuple[Path, Path | None, str], tuple[int, int, int] | None]:
+    """Asyncio counterpart of probe_file_entry; trusted_name's xattr reads run on the default executor."""
+    if ALREADY_TAGGED_RE.search(filepath.stem):
+        return ((filepath, None, "SKIP (already tagged)"), None)
+    if trust != "off" and await asyncio.get_running_loop().run_in_executor(None, trusted_name, filepath, trust):
+        return ((filepath, None, "SKIP (already named)"), None)
+    probe_result = await cached_probe_async(ffprobe_path, filepath, cache, fast, xattrs)
+    return (plan_entry(filepath, probe_result), probe_result)
+
+
+def print_plan(plan: list[tuple[Path, Path | None, str]]) -> None:
+    """Print the plan as a fixed-width table."""
+    print(f"{'STATUS':<22} {'OLD NAME':<50} {'NEW NAME'}")
+    print("-" * 130)
+    for old_path, new_path, status in plan:
+        old_name = old_path.name
+        new_name = new_path.name if new_path else "-"
+        print(f"{status:<22} {old_name:<50} {new_name}")
+    print("-" * 130)
+
+
+def resolve_collisions(
+    plan: list[tuple[Path, Path | None, str]],
+) -> list[tuple[Path, Path | None, str]]:
+    """Skip renames whose target is taken by a file that stays or by an earlier entry.
+
+    Each target directory is listed once instead of calling exists() per file.
+    Names are compared case-insensitively, since case-insensitive mounts
+    (SMB, exFAT) would otherwise let one rename overwrite another. Among
+    sources competing for one target, the first in plan order wins. A target
+    that is currently another file's name is fine as long as that file is
+    itself renamed away in this plan; order_renames sequences those.
+    """
+    statuses = [status for _, _, status in plan]
+    listings: dict[str, dict[str, int]] = {}
+    claimed: dict[tuple[str, str], int] = {}
+    movers: dict[tuple[str, str], int] = {}
+
+    for i, (old_path, new_path, status) in enumerate(plan):
+        if status != "RENAME" or new_path is None:
+            continue
+        directory = str(new_path.parent)
+        if directory not in listings:
+            names: dict[str, int] = {}
+            try:
+                for name in os.listdir(directory):
+                    folded = name.casefold()
+                    names[folded] = names.get(folded, 0) + 1
+            except OSError:
+                pass
+            listings[directory] = names
+        key = _name_key(new_path)
+        if key in claimed:
+            statuses[i] = "SKIP (collision)"
+            continue
+        claimed[key] = i
+        source = _name_key(old_path)
+        movers[source] = movers.get(source, 0) + 1
+
+    # A target is free once every file currently holding that name moves away.
+    # Skipping one rename keeps its source in place, which may block the rename
+    # aiming at that source, so re-check dependents until nothing changes.
+    pending = list(claimed.values())
+    while pending:
+        i = pending.pop()
+        if statuses[i] != "RENAME":
+            continue
+        directory, folded = key = _name_key(plan[i][1])
+        if listings[directory].get(folded, 0) <= movers.get(key, 0):
+            continue
+        statuses[i] = "SKIP (target exists)"
+        source = _name_key(plan[i][0])
+        movers[source] -= 1
+        if source in claimed:
+            pending.append(claimed[source])
+
+    return [(old_path, new_path, status) for (old_path, new_path, _), status in zip(plan, statuses)]
+
+
+def _temporary_path(path: Path) -> Path:
+    """Return an unused hidden name next to path for parking it during a rename cycle."""
+    for n in itertools.count():
+        candidate = path.with_name(f".{path.name}.{os.getpid()}.{n}.renaming")
+        if not os.path.lexists(candidate):
+            return candidate
+    raise AssertionError("unreachable")
+
+
+def order_renames(plan: list[tuple[Path, Path | None, str]]) -> list[tuple[Path, Path, Path, bool]]:
+    """Order the plan's renames so none overwrites a file that has yet to move.
+
+    Returns (old_path, src, dst, final) steps. A rename whose target is another
+    renamed file's current name runs after it. Cycles (e.g. two files swapping
+    names) are broken by first parking one member under a temporary name; that
+    step has final set to False.
+    """
+    entries = [(old, new) for old, new, status in plan if status == "RENAME" and new is not None]
+    claimant = {_name_key(new): i for i, (_, new) in enumerate(entries)}
+    waiting = [0] * len(entries)
+    for old, _ in entries:
+        j = claimant.get(_name_key(old))
+        if j is not None:
+            waiting[j] += 1
+
+    current = [old for old, _ in entries]
+    done = [False] * len(entries)
+    ready = deque(i for i, count in enumerate(waiting) if count == 0)
+    steps: list[tuple[Path, Path, Path, bool]] = []
+
+    def release(i: int) -> None:
+        j = claimant.get(_name_key(entries[i][0]))
+        if j is not None:
+            waiting[j] -= 1
+            if waiting[j] == 0:
+                ready.append(j)
+
+    remaining = len(entries)
+    candidate = 0
+    while remaining:
+        while ready:
+            i = ready.popleft()
+            old, new = entries[i]
+            steps.append((old, current[i], new, True))
+            done[i] = True
+            remaining -= 1
+            if current[i] == old:
+                release(i)
+        if remaining:
+            while done[candidate] or current[candidate] != entries[candidate][0]:
+                candidate += 1
+            old = entries[candidate][0]
+            current[candidate] = _temporary_path(old)
+            steps.append((old, old, current[candidate], False))
+            release(candidate)
+    return steps
+
+
+def write_plan_file(path: Path, plan: list[tuple[Path, Path | None, str]]) -> int:
+    """Write the plan's renames with each source's identity; return the number written.
+
+    The file is JSON lines: a header, then one record per RENAME entry holding
+    the source's st_ino, st_size and st_mtime_ns so --apply-plan can detect
+    files that changed after the dry run. Sources that vanished are left out.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"plan": PLAN_FILE_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z")}) + "\n")
+        for old_path, new_path, status in plan:
+            if status != "RENAME" or new_path is None:
+                continue
+            try:
+                st = old_path.stat()
+            except OSError:
+                continue
+            record = {
+                "old": str(old_path),
+                "new": str(new_path),
+                "ino": st.st_ino,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+
+def load_plan_file(path: Path) -> list[tuple[Path, Path | None, str]]:
+    """Read a plan file and revalidate every source with a single stat.
+
+    Entries whose source is missing or whose inode, size or mtime differ from
+    the recorded ones get "SKIP (changed)"; the rest are RENAME again.
+    """
+    plan = []
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("plan") != PLAN_FILE_VERSION:
+            raise ValueError(f"{path} is not a version {PLAN_FILE_VERSION} plan file")
+        for line in f:
+            record = json.loads(line)
+            old_path = Path(record["old"])
+            new_path = Path(record["new"])
+            try:
+                st = old_path.stat()
+            except OSError:
+                plan.append((old_path, new_path, "SKIP (changed)"))
+                continue
+            identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if identity != (record["ino"], record["size"], record["mtime_ns"]):
+                plan.append((old_path, new_path, "SKIP (changed)"))
+            else:
+                plan.append((old_path, new_path, "RENAME"))
+    plan.sort(key=lambda p: str(p[0]))
+    return plan
+
+
+def default_journal_path() -> Path:
+    """Return a fresh journal path for an --apply run."""
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+    return default_cache_path().parent / "journals" / name
+
+
+class RenameJournal:
+    """Write-ahead journal of rename steps, used by --resume and --undo.
+
+    The whole ordered list of steps is written up front, one JSON line per
+    batch of JOURNAL_BATCH steps, and fsync'd once before the first rename.
+    A {"done": [start, end]} line follows each applied batch and a status line
+    closes the run. Done lines are not fsync'd: after a crash, --resume checks
+    the files on disk for any step not yet marked done.
+    """
+
+    def __init__(
+        self, path: Path, steps: list[tuple[Path, Path, Path, bool]], applied: set[int], status: str | None
+    ) -> None:
+        self.path = path
+        self.steps = steps
+        self.applied = applied
+        self.status = status
+        self._file = None
+
+    @classmethod
+    def create(cls, path: Path, steps: list[tuple[Path, Path, Path, bool]]) -> "RenameJournal":
+        """Write a new journal for steps and make it durable."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        journal = cls(path, steps, set(), None)
+        journal._file = open(path, "x", encoding="utf-8")
+        for start in range(0, len(steps), JOURNAL_BATCH):
+            batch = steps[start:start + JOURNAL_BATCH]
+            records = [[str(old), str(src), str(dst), final] for old, src, dst, final in batch]
+            journal._file.write(json.dumps({"steps": records}) + "\n")
+        journal._sync()
+        return journal
+
+    @classmethod
+    def load(cls, path: Path) -> "RenameJournal":
+        """Read an existing journal and reopen it for appending."""
+        steps: list[tuple[Path, Path, Path, bool]] = []
+        applied: set[int] = set()
+        status = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # A torn final line from a crash; everything after it is unwritten.
+                if "steps" in record:
+                    steps.extend((Path(old), Path(src), Path(dst), final) for old, src, dst, final in record["steps"])
+                elif "done" in record:
+                    applied.update(range(*record["done"]))
+                elif "status" in record:
+                    status = record["status"]
+        journal = cls(path, steps, applied, status)
+        journal._file = open(path, "a", encoding="utf-8")
+        return journal
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def mark_done(self, start: int, end: int) -> None:
+        """Record that steps[start:end] have been attempted."""
+        self.applied.update(range(start, end))
+        self._file.write(json.dumps({"done": [start, end]}) + "\n")
+        self._file.flush()
+
+    def close(self, status: str) -> None:
+        """Record the final status of the run and close the journal."""
+        self.status = status
+        self._file.write(json.dumps({"status": status}) + "\n")
+        self._sync()
+        self._file.close()
+
+
+def apply_renames(
+    steps: list[tuple[Path, Path, Path, bool]],
+    journal: RenameJournal | None = None,
+    resume: bool = False,
+    sidecar: bool = False,
+) -> tuple[int, int]:
+    """Run rename steps from order_renames, printing each; return (renamed, failed).
+
+    When a step fails its source stays where it is, so later steps aiming at
+    that name are skipped rather than allowed to overwrite it. With a journal,
+    steps it already marks done are skipped and each batch is marked done once
+    attempted. With resume, steps whose target already exists are checked
+    against the disk instead of being renamed again. Renamed files are
+    stamped for --trust-names; sidecar is passed to write_name_stamps.
+    """
+    success = 0
+    fail = 0
+    renamed: list[Path] = []
+    occupied: set[tuple[str, str]] = set()
+    not_parked: dict[Path, str] = {}
+    targets = {dst for _, _, dst, _ in steps} if resume else set()
+    for start in range(0, len(steps), JOURNAL_BATCH):
+        end = min(start + JOURNAL_BATCH, len(steps))
+        if journal is not None and journal.applied.issuperset(range(start, end)):
+            continue
+        for index in range(start, end):
+            if journal is not None and index in journal.applied:
+                continue
+            old_path, src, dst, final = steps[index]
+            if resume and os.path.lexists(dst):
+                # Never rename onto an existing file. The step already ran if its
+                # source is gone or has since been taken by a later step's rename.
+                if os.path.lexists(src) and src not in targets:
+                    error = "target exists"
+                elif final:
+                    print(f"  OK  {old_path.name} -> {dst.name} (already applied)")
+                    renamed.append(dst)
+                    success += 1
+                    continue
+                else:
+                    continue
+            elif src in not_parked:
+                error = f"could not move to a temporary name: {not_parked[src]}"
+            elif _name_key(dst) in occupied:
+                error = "target is still occupied"
+            else:
+                try:
+                    os.rename(str(src), str(dst))
+                except OSError as e:
+                    error = str(e)
+                else:
+                    if final:
+                        print(f"  OK  {old_path.name} -> {dst.name}")
+                        renamed.append(dst)
+                        success += 1
+                    continue
+            occupied.add(_name_key(src))
+            if not final:
+                not_parked[dst] = error
+                continue
+            left = f" (left as {src.name})" if src != old_path and src not in not_parked else ""
+            print(f"  FAIL {old_path.name}: {error}{left}")
+            fail += 1
+        if journal is not None:
+            journal.mark_done(start, end)
+    write_name_stamps(renamed, sidecar)
+    if journal is not None:
+        journal.close("complete")
+    return (success, fail)
 
 
-def check_ffprobe() -> str:
-    """Return the path to ffprobe, or exit with an error message."""
-    path = shutil.which("ffprobe")
-    if path is None:
-        print("Error: ffprobe not found. Install it with: sudo apt install ffmpeg", file=sys.stderr)
-        sys.exit(1)
-    return path
+def undo_renames(journal: RenameJournal) -> tuple[int, int]:
+    """Revert the steps of a journal in reverse order; return (restored, failed).
+
+    Only steps whose target exists and whose source is free are reverted, so
+    undoing a partially applied run is safe. Undoing a run twice is not: a
+    swap would be reverted again, so run_journal refuses undone journals.
+    """
+    success = 0
+    fail = 0
+    restored: list[Path] = []
+    new_names = {old_path: dst for old_path, _, dst, final in journal.steps if final}
+    for old_path, src, dst, final in reversed(journal.steps):
+        if not os.path.lexists(dst) or os.path.lexists(src):
+            continue
+        try:
+            os.rename(str(dst), str(src))
+        except OSError as e:
+            print(f"  FAIL {new_names[old_path].name}: {e}")
+            fail += 1
+            continue
+        if src == old_path:
+            print(f"  OK  {new_names[old_path].name} -> {old_path.name}")
+            restored.append(old_path)
+            success += 1
+    clear_name_stamps(restored)
+    journal.close("undone")
+    return (success, fail)
 
 
-def probe_video(ffprobe_path: str, filepath: Path) -> tuple[int, int, int] | None:
-    """Probe a video file and return (duration_min, width, height), or None on failure."""
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """Progress line driven by probe completions, redrawn at a fixed interval.
+
+    Shows completed/total, throughput, probe latency percentiles over the most
+    recent PROGRESS_WINDOW probes and an ETA. While the directory walk is still
+    running the total is shown as a lower bound and no ETA is given. The scan
+    updates scanned and scan_done; update is passed to an engine as on_result.
+    """
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL) -> None:
+        self.interval = interval
+        self.scanned = 0
+        self.scan_done = False
+        self.completed = 0
+        self._latencies: deque[float] = deque(maxlen=PROGRESS_WINDOW)
+        self._start = time.perf_counter()
+        self._last_draw = 0.0
+        self._width = 0
+
+    def update(self, result: object, seconds: float) -> None:
+        """Record one finished probe and redraw if the refresh interval has passed."""
+        self.completed += 1
+        self._latencies.append(seconds)
+        now = time.perf_counter()
+        if now - self._last_draw >= self.interval:
+            self._last_draw = now
+            self._draw(now)
+
+    def finish(self) -> None:
+        """Draw the final state and end the progress line."""
+        self._draw(time.perf_counter())
+        print()
+
+    def _draw(self, now: float) -> None:
+        elapsed = now - self._start
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        if self.scan_done:
+            pct = (self.completed / self.scanned) * 100 if self.scanned else 100.0
+            line = f"  Progress: {self.completed}/{self.scanned} ({pct:.1f}%)"
+        else:
+            line = f"  Progress: {self.completed}/{self.scanned}+ (scanning)"
+        line += f" | {rate:.1f} files/s"
+        if self._latencies:
+            latencies = sorted(self._latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            line += f" | probe p50 {p50:.2f}s p95 {p95:.2f}s"
+        if self.scan_done and 0 < rate and self.completed < self.scanned:
+            line += f" | ETA {_format_eta((self.scanned - self.completed) / rate)}"
+        print(line.ljust(self._width), end="\r", flush=True)
+        self._width = len(line)
+
+
+@functools.lru_cache(maxsize=None)
+def _whole_disk(st_dev: int) -> int:
+    """Map a partition's device number to its whole disk's, via sysfs where available."""
+    sysfs = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+    if not os.path.exists(os.path.join(sysfs, "partition")):
+        return st_dev
     try:
-        result = subprocess.run(
-            [
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1",
-                str(filepath),
-            ],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        if result.returncode != 0:
-            return None
-        
-        lines = result.stdout.strip().split("\n")
-        values = {}
-        for line in lines:
-            if "=" in line:
-                key, val = line.split("=", 1)
-                values[key] = val
-        
-        width = int(values.get("width", 0))
-        height = int(values.get("height", 0))
-        seconds = float(values.get("duration", 0))
-        
-        if width <= 0 or height <= 0:
-            return None
-        
-        duration_min = max(1, round(seconds / 60))
-        return (duration_min, width, height)
-    except (subprocess.TimeoutExpired, ValueError, OSError):
+        with open(os.path.join(os.path.realpath(sysfs), "..", "dev"), encoding="ascii") as f:
+            major, minor = f.read().strip().split(":")
+    except (OSError, ValueError):
+        return st_dev
+    return os.makedev(int(major), int(minor))
+
+
+def device_of(filepath: Path) -> int:
+    """Return the scheduling bucket for a file: its disk, or st_dev when that is unknown.
+
+    Partitions of one disk share a bucket, since they share its heads.
+    """
+    try:
+        return _whole_disk(os.stat(filepath).st_dev)
+    except OSError:
+        return 0
+
+
+class DeviceQueue:
+    """Paths bucketed by device, handed out only while their device is below limit.
+
+    Devices are served round-robin so every disk gets work. Not thread-safe;
+    each engine drives it from a single thread.
+    """
+
+    def __init__(self, limit: int, device: Callable[[Path], int] = device_of) -> None:
+        self.limit = limit
+        self._device = device
+        self._buckets: dict[int, deque[Path]] = {}
+        self._in_flight: Counter[int] = Counter()
+        self._taken: dict[Path, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, filepath: Path) -> None:
+        self._buckets.setdefault(self._device(filepath), deque()).append(filepath)
+        self._size += 1
+
+    def pop_ready(self) -> Path | None:
+        """Return a queued path whose device has a free slot, or None."""
+        for dev in list(self._buckets):
+            bucket = self._buckets[dev]
+            if not bucket or self._in_flight[dev] >= self.limit:
+                continue
+            # Move the device to the back so the next call starts with another one.
+            del self._buckets[dev]
+            self._buckets[dev] = bucket
+            filepath = bucket.popleft()
+            self._in_flight[dev] += 1
+            self._taken[filepath] = dev
+            self._size -= 1
+            return filepath
         return None
 
+    def release(self, filepath: Path) -> None:
+        """Free the slot taken by a path returned from pop_ready."""
+        self._in_flight[self._taken.pop(filepath)] -= 1
 
-def collect_video_files(folder: Path, extensions: tuple[str, ...]) -> list[Path]:
-    """Recursively collect video files matching the given extensions."""
-    def gen():
-        for ext in extensions:
-            yield from folder.rglob(f"*.{ext}")
-            yield from folder.rglob(f"*.{ext.upper()}")
-    
-    files = list(gen())
-    
-    seen: set[Path] = set()
-    unique: list[Path] = []
-    for f in files:
-        resolved = f.resolve()
-        if resolved not in seen:
-            seen.add(resolved)
-            unique.append(f)
-    unique.sort(key=lambda p: str(p))
-    return unique
 
+class AdaptiveConcurrency:
+    """AIMD controller for the number of probes in flight.
 
-def build_new_path(filepath: Path, duration_min: int, width: int, height: int) -> Path:
-    """Build a new path with duration and resolution."""
-    stem = filepath.stem
-    
-    stem = CHINESE_DURATION_RE.sub(f"{duration_min}min", stem)
-    
-    if TRAILING_RESOLUTION_RE.search(stem):
-        stem = TRAILING_RESOLUTION_RE.sub(f"_{width}x{height}", stem)
+    Completions are measured in windows of at least ADAPTIVE_INTERVAL seconds.
+    The limit doubles each window until the first back-off, then grows by one
+    per window. When a limit above the one with the best throughput so far
+    brings no more throughput but a higher median latency, the mount is
+    saturated and the limit is cut to ADAPTIVE_BACKOFF of itself. Windows in
+    which the limit was never reached (the walk could not keep up) leave it
+    unchanged.
+    """
+
+    def __init__(self, maximum: int, initial: int = ADAPTIVE_INITIAL_JOBS) -> None:
+        self.maximum = maximum
+        self.limit = min(initial, maximum)
+        # (seconds since start, limit during the window, files/s, median probe seconds)
+        self.history: list[tuple[float, int, float, float]] = []
+        self._start = time.perf_counter()
+        self._window_start = self._start
+        self._latencies: list[float] = []
+        self._saturated = False
+        self._slow_start = True
+        # (limit, files/s, median probe seconds) of the window with the best throughput
+        self._best: tuple[int, float, float] | None = None
+
+    def record(self, seconds: float, in_flight: int) -> None:
+        """Account for one finished probe; in_flight counts probes running when it was started."""
+        self._latencies.append(seconds)
+        self._saturated = self._saturated or in_flight >= self.limit
+        now = time.perf_counter()
+        if now - self._window_start < ADAPTIVE_INTERVAL or len(self._latencies) < ADAPTIVE_MIN_SAMPLES:
+            return
+        rate = len(self._latencies) / (now - self._window_start)
+        latency = sorted(self._latencies)[len(self._latencies) // 2]
+        self.history.append((self._window_start - self._start, self.limit, rate, latency))
+        self._window_start = now
+        self._latencies = []
+        saturated, self._saturated = self._saturated, False
+        if not saturated:
+            return
+
+        if self._best is None or rate > self._best[1]:
+            self._best = (self.limit, rate, latency)
+        best_limit, best_rate, best_latency = self._best
+        if (
+            self.limit > best_limit
+            and rate < best_rate * (1 + ADAPTIVE_GAIN)
+            and latency > best_latency * (1 + ADAPTIVE_GAIN)
+        ):
+            self._slow_start = False
+            self.limit = max(1, int(self.limit * ADAPTIVE_BACKOFF))
+            return
+        self.limit = min(self.maximum, self.limit * 2 if self._slow_start else self.limit + 1)
+
+    def summary(self) -> str:
+        """Describe the final limit and how it got there."""
+        levels = [limit for _, limit, _, _ in self.history]
+        steps = [level for i, level in enumerate(levels) if i == 0 or level != levels[i - 1]]
+        if not steps or steps[-1] != self.limit:
+            steps.append(self.limit)
+        return f"Concurrency: settled at {self.limit} in flight (history: {' -> '.join(map(str, steps))})"
+
+
+def run_threaded(
+    files: Iterable[Path],
+    probe_file: Callable[[Path], R],
+    jobs: int | None,
+    on_result: Callable[[R, float], None] | None = None,
+    keep: Callable[[R], bool] | None = None,
+    per_device: int | None = None,
+    controller: AdaptiveConcurrency | None = None,
+    device: Callable[[Path], int] = device_of,
+) -> list[R]:
+    """Probe files on a thread pool with at most jobs workers.
+
+    files may be a lazy iterator such as the directory walker. At most
+    QUEUE_PER_JOB paths per worker are queued ahead of the workers, so probing
+    starts with the first path and memory stays bounded. on_result is called
+    with each result and the seconds its probe took as soon as it completes.
+    Results are returned in completion order; when keep is given, only results
+    it accepts are retained. With per_device, at most that many probes run on
+    any one disk at a time, reading up to DEVICE_LOOKAHEAD paths ahead of the
+    workers to find work for idle disks; device maps a path to its disk. With
+    a controller, its limit replaces jobs as the number of probes in flight and
+    is adjusted as probes finish.
+    """
+    workers = jobs or min(32, (os.cpu_count() or 1) + 4)
+    results: list[R] = []
+    pending: dict[Future, tuple[Path, int]] = {}
+
+    def timed_probe(filepath: Path) -> tuple[R, float]:
+        start = time.perf_counter()
+        result = probe_file(filepath)
+        return (result, time.perf_counter() - start)
+
+    def collect(return_when: str) -> None:
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            filepath, in_flight = pending.pop(future)
+            if devices is not None:
+                devices.release(filepath)
+            result, seconds = future.result()
+            if controller is not None:
+                controller.record(seconds, in_flight)
+            if keep is None or keep(result):
+                results.append(result)
+            if on_result is not None:
+                on_result(result, seconds)
+
+    def capacity() -> int:
+        if controller is not None:
+            return controller.limit
+        return workers if devices is not None else workers * QUEUE_PER_JOB
+
+    devices = DeviceQueue(per_device, device) if per_device else None
+    paths = iter(files)
+    exhausted = False
+
+    def next_path() -> Path | None:
+        nonlocal exhausted
+        while not exhausted:
+            if devices is not None:
+                filepath = devices.pop_ready()
+                if filepath is not None or len(devices) >= DEVICE_LOOKAHEAD:
+                    return filepath
+            try:
+                filepath = next(paths)
+            except StopIteration:
+                exhausted = True
+                break
+            if devices is None:
+                return filepath
+            devices.add(filepath)
+        return devices.pop_ready() if devices is not None else None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < capacity() and (filepath := next_path()) is not None:
+                pending[executor.submit(timed_probe, filepath)] = (filepath, len(pending) + 1)
+            if not pending:
+                break
+            collect(FIRST_COMPLETED)
+    return results
+
+
+def _use_pidfd_child_watcher() -> None:
+    """Wait for subprocesses with pidfds instead of one waiter thread per process.
+
+    Python 3.12+ does this on its own; on older versions the default watcher
+    starts a thread for every child, which defeats the point of the async engine.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
+
+def run_async(
+    files: Iterable[Path],
+    probe_file: Callable[[Path], Awaitable[R]],
+    jobs: int,
+    on_result: Callable[[R, float], None] | None = None,
+    keep: Callable[[R], bool] | None = None,
+    per_device: int | None = None,
+    controller: AdaptiveConcurrency | None = None,
+    device: Callable[[Path], int] = device_of,
+) -> list[R]:
+    """Probe files on an asyncio event loop with at most jobs probes in flight.
+
+    files is consumed on a helper thread, so a slow directory walk never blocks
+    the event loop, and feeds a bounded queue read by a fixed pool of jobs
+    worker coroutines. Blocking work probe_file hands to the loop's default
+    executor (header reads, cache lookups) gets the thread engine's default
+    pool size plus a thread for the walk, however large jobs is; only
+    subprocesses run jobs-wide. Results, on_result, keep, per_device,
+    controller and device work as in run_threaded.
+    """
+    jobs = max(1, jobs)
+    results: list[R] = []
+
+    async def run() -> None:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4) + 1))
+        queue: asyncio.Queue[Path | None] = asyncio.Queue(maxsize=jobs * QUEUE_PER_JOB)
+        devices = None
+        if per_device:
+            devices = DeviceQueue(per_device, device)
+        elif controller is not None:
+            devices = DeviceQueue(jobs, lambda _: 0)
+        # Guards devices and in_flight; workers wait on it for a path they may start.
+        ready = asyncio.Condition()
+        walked = False
+        in_flight = 0
+
+        # Set once run() exits, for instance when Ctrl+C cancels it. The walk
+        # thread then stops handing over paths, and the handoff it is blocked
+        # on is cancelled, so it never waits on a loop that has stopped.
+        stop = threading.Event()
+        handoff_lock = threading.Lock()
+        handoff: list[Future] = []
+        walk_done = asyncio.Event()
+
+        def send(coro: Awaitable[None]) -> bool:
+            """Run coro on the loop and wait for it; return False once run() has exited."""
+            with handoff_lock:
+                if stop.is_set():
+                    coro.close()
+                    return False
+                future = asyncio.run_coroutine_threadsafe(coro, loop)
+                handoff[:] = [future]
+            try:
+                future.result()
+            except CancelledError:
+                return False
+            return True
+
+        def produce() -> None:
+            try:
+                for filepath in files:
+                    if not send(add(filepath) if devices is not None else queue.put(filepath)):
+                        return
+            finally:
+                with handoff_lock:
+                    if not stop.is_set():
+                        loop.call_soon_threadsafe(walk_done.set)
+
+        async def add(filepath: Path) -> None:
+            async with ready:
+                await ready.wait_for(lambda: len(devices) < DEVICE_LOOKAHEAD)
+                devices.add(filepath)
+                ready.notify_all()
+
+        async def finish_walk() -> None:
+            nonlocal walked
+            await walk_done.wait()
+            if devices is None:
+                for _ in range(jobs):
+                    await queue.put(None)
+                return
+            async with ready:
+                walked = True
+                ready.notify_all()
+
+        def pop_ready() -> Path | None:
+            if controller is not None and in_flight >= controller.limit:
+                return None
+            return devices.pop_ready()
+
+        async def take() -> tuple[Path, int] | None:
+            nonlocal in_flight
+            if devices is None:
+                filepath = await queue.get()
+                return None if filepath is None else (filepath, 0)
+            async with ready:
+                while (filepath := pop_ready()) is None:
+                    if walked and not len(devices):
+                        return None
+                    await ready.wait()
+                in_flight += 1
+                ready.notify_all()
+                return (filepath, in_flight)
+
+        async def release(filepath: Path) -> None:
+            nonlocal in_flight
+            if devices is not None:
+                async with ready:
+                    devices.release(filepath)
+                    in_flight -= 1
+                    ready.notify_all()
+
+        async def worker() -> None:
+            while (taken := await take()) is not None:
+                filepath, started_with = taken
+                start = time.perf_counter()
+                try:
+                    result = await probe_file(filepath)
+                finally:
+                    await release(filepath)
+                seconds = time.perf_counter() - start
+                if controller is not None:
+                    controller.record(seconds, started_with)
+                if keep is None or keep(result):
+                    results.append(result)
+                if on_result is not None:
+                    on_result(result, seconds)
+
+        try:
+            await asyncio.gather(loop.run_in_executor(None, produce), finish_walk(), *(worker() for _ in range(jobs)))
+        finally:
+            with handoff_lock:
+                stop.set()
+                if handoff:
+                    handoff[0].cancel()
+
+    _use_pidfd_child_watcher()
+    asyncio.run(run())
+    return results
+
+
+class Inotify:
+    """Minimal Linux inotify binding over ctypes that watches whole directory trees."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform") from None
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = init(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs: dict[int, str] = {}
+        self.overflowed = False
+
+    def add_tree(self, folder: str) -> list[str]:
+        """Watch folder and every directory below it; return the directories added."""
+        added = []
+        stack = [folder]
+        while stack:
+            path = stack.pop()
+            wd = self._add_watch(self.fd, os.fsencode(path), self.MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (see fs.inotify.max_user_watches)")
+                continue
+            self._dirs[wd] = path
+            added.append(path)
+            try:
+                with os.scandir(path) as it:
+                    stack.extend(e.path for e in it if e.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+        return added
+
+    def read(self, timeout: float | None) -> list[tuple[str, int]]:
+        """Wait up to timeout seconds and return (path, mask) for each event read."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 65536)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is not None and name:
+                events.append((os.path.join(directory, name), mask))
+        return events
+
+    def close(self) -> None:
+        """Stop watching and release the inotify descriptor."""
+        os.close(self.fd)
+
+
+def watch_folder(args: argparse.Namespace, records: PlanRecordWriter | None) -> None:
+    """Probe and rename video files as they are written into or moved into args.folder.
+
+    A file is processed once no event has arrived for it and its size and mtime
+    have stayed the same for args.debounce seconds, so files still being
+    downloaded are left alone. Directories created under the folder are watched
+    too, and files already in a directory moved in are picked up with it.
+    """
+    folder: Path = args.folder.resolve()
+    if not folder.is_dir():
+        print(f"Error: {folder} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    ffprobe_path = check_ffprobe()
+    extensions = tuple(ext.lstrip(".") for ext in args.ext)
+    suffixes = frozenset(ext.lower() for ext in extensions)
+    try:
+        inotify = Inotify()
+        watched = len(inotify.add_tree(str(folder)))
+    except OSError as e:
+        print(f"Error: cannot watch {folder}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None if args.no_cache else ProbeCache(args.cache_path.expanduser())
+    xattrs = XattrCache() if xattrs_supported() and not args.no_xattrs else None
+    probe_file = functools.partial(
+        probe_file_entry, ffprobe_path, cache=cache, fast=not args.ffprobe_only, trust=args.trust_names, xattrs=xattrs
+    )
+
+    # path -> (deadline, size, mtime_ns) of files waiting to settle.
+    pending: dict[str, tuple[float, int, int]] = {}
+    # Names this process renamed files to; their IN_MOVED_TO events are ours.
+    renamed_to: set[str] = set()
+    # Each batch of renames gets its own journal, numbered after this base path.
+    journal_base = (args.journal or default_journal_path()).expanduser()
+    success = fail = batches = 0
+
+    def schedule(path: str) -> None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            pending.pop(path, None)
+            return
+        pending[path] = (time.monotonic() + args.debounce, st.st_size, st.st_mtime_ns)
+
+    def is_video(path: str) -> bool:
+        _, dot, ext = os.path.basename(path).rpartition(".")
+        return bool(dot) and ext.lower() in suffixes
+
+    def process(paths: list[Path]) -> None:
+        nonlocal success, fail, batches
+        outcomes = run_threaded(paths, probe_file, args.jobs, per_device=args.per_device_jobs)
+        plan = resolve_collisions(sorted((entry for entry, _ in outcomes), key=lambda p: str(p[0])))
+        if records is not None:
+            probe_results = {entry[0]: probe_result for entry, probe_result in outcomes}
+            for entry in plan:
+                records.write("plan", entry, probe_results[entry[0]])
+        else:
+            print_plan(plan)
+        if not args.apply:
+            return
+        steps = order_renames(plan)
+        if not steps:
+            return
+        # Journals left by an earlier session with the same --journal keep their numbers.
+        while True:
+            batches += 1
+            journal_path = journal_base.with_name(f"{journal_base.stem}-{batches}{journal_base.suffix}")
+            try:
+                journal = RenameJournal.create(journal_path, steps)
+            except FileExistsError:
+                continue
+            except OSError as e:
+                print(f"Warning: cannot write journal {journal_path}: {e}; not renaming this batch", file=sys.stderr)
+                return
+            break
+        print(f"\nApplying renames (journal: {journal_path})...\n")
+        renamed_to.update(str(dst) for _, _, dst, final in steps if final)
+        ok, failed = apply_renames(steps, journal, sidecar=args.trust_names != "off")
+        success += ok
+        fail += failed
+
+    print(f"Watching {folder} ({watched} director(ies)); press Ctrl+C to stop.\n")
+    try:
+        while True:
+            now = time.monotonic()
+            timeout = max(0.0, min(d for d, _, _ in pending.values()) - now) if pending else None
+            for path, mask in inotify.read(timeout):
+                if mask & IN_ISDIR:
+                    inotify.add_tree(path)
+                    for entry in iter_video_entries(Path(path), extensions):
+                        schedule(entry.path)
+                elif mask & IN_CREATE:
+                    continue
+                elif path in renamed_to:
+                    renamed_to.discard(path)
+                elif is_video(path):
+                    schedule(path)
+            if inotify.overflowed:
+                print("Warning: inotify queue overflowed; some new files may have been missed", file=sys.stderr)
+                inotify.overflowed = False
+
+            now = time.monotonic()
+            ready = []
+            for path, (deadline, size, mtime_ns) in list(pending.items()):
+                if deadline > now:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    del pending[path]
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                    schedule(path)
+                    continue
+                del pending[path]
+                ready.append(Path(path))
+            if ready:
+                process(ready)
+                if cache is not None:
+                    cache.commit()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        inotify.close()
+        if cache is not None:
+            cache.close()
+
+    if args.apply:
+        print(f"\nStopped watching. Renamed: {success} | Failed: {fail}")
     else:
-        stem = f"{stem}_{width}x{height}"
-    
-    return filepath.with_stem(stem)
+        print("\nStopped watching. Dry-run mode; no files were renamed.")
 
 
-def main() -> None:
-    start_time = time.time()
-    print("Video File Auto Renamer - Starting...")
-    
+def build_parser() -> argparse.ArgumentParser:
+    """Return the command line parser."""
     parser = argparse.ArgumentParser(
         description="Rename video files to include duration and resolution (e.g. Movie_45min_1920x1080.mp4)"
     )
-    parser.add_argument("folder", type=Path, help="Path to video folder to scan")
+    parser.add_argument("folder", type=Path, nargs="?", help="Path to video folder to scan")
     parser.add_argument(
         "--apply",
         action="store_true",
@@ -124,10 +2780,193 @@ def main() -> None:
     parser.add_argument(
         "--progress",
         action="store_true",
-        help="Show progress bar during processing",
+        help="Show progress with throughput, probe latency and ETA during processing",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--cache-path",
+        type=Path,
+        default=default_cache_path(),
+        help="Probe result cache database (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the probe result cache",
+    )
+    parser.add_argument(
+        "--no-xattrs",
+        action="store_true",
+        help="Do not read or write probe results in the files' user.videoname.* extended attributes",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the listings of directories whose mtime has not changed since the last scan",
+    )
+    parser.add_argument(
+        "--index-path",
+        type=Path,
+        default=default_index_path(),
+        help="Directory index database used by --incremental (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ffprobe-only",
+        action="store_true",
+        help="Always probe with ffprobe instead of the built-in container header parsers",
+    )
+    parser.add_argument(
+        "--trust-names",
+        choices=TRUST_NAMES,
+        default="off",
+        help="Skip probing names ending in _WIDTHxHEIGHT: 'tagged' only if this tool renamed the file "
+        "and its size and mtime are unchanged, 'resolution' always (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("thread", "async"),
+        default="thread",
+        help="Probe engine: a thread pool, or asyncio subprocesses without a thread per probe (default: thread)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help=f"Maximum probes in flight (default: the thread pool default, or {ASYNC_DEFAULT_JOBS} for --engine async)",
+    )
+    parser.add_argument(
+        "--order",
+        choices=("walk", "physical"),
+        default="walk",
+        help="Probe files as the walk finds them, or sorted by their location on disk "
+        "(FIEMAP, else inode number) to avoid seeks on HDDs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help=f"Tune the number of probes in flight while running, up to --jobs (default: {ADAPTIVE_MAX_JOBS})",
+    )
+    parser.add_argument(
+        "--per-device-jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Run at most N probes at a time on each disk; --jobs still caps the total",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=None,
+        help="Where --apply writes its rename journal (default: a new file under the cache directory); "
+        "--watch writes one journal per batch, numbered -1, -2, ... after this name",
+    )
+    parser.add_argument(
+        "--plan-out",
+        type=Path,
+        metavar="FILE",
+        help="Write the planned renames, with each source's inode, size and mtime, for --apply-plan",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=WATCH_DEBOUNCE,
+        metavar="SECONDS",
+        help="With --watch, wait until a file has been unchanged this long before probing it (default: %(default)s)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and probe and rename new files as they are written or moved in (Linux only)",
+    )
+    mode.add_argument(
+        "--apply-plan",
+        type=Path,
+        metavar="FILE",
+        help="Apply a plan written by --plan-out after revalidating each source, without probing",
+    )
+    mode.add_argument(
+        "--resume",
+        type=Path,
+        metavar="JOURNAL",
+        help="Finish the renames recorded in an interrupted journal, without scanning or probing",
+    )
+    mode.add_argument(
+        "--undo",
+        type=Path,
+        metavar="JOURNAL",
+        help="Revert the renames recorded in a journal",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("table", "ndjson", "csv"),
+        default="table",
+        help="Plan output: a table printed at the end, or NDJSON/CSV records streamed to stdout "
+        "as files are probed, with all other messages on stderr (default: table)",
+    )
+    return parser
+
+
+def apply_plan(args: argparse.Namespace, plan: list[tuple[Path, Path | None, str]]) -> None:
+    """Journal and apply the plan's renames."""
+    steps = order_renames(plan)
+    journal_path = (args.journal or default_journal_path()).expanduser()
+    try:
+        journal = RenameJournal.create(journal_path, steps)
+    except OSError as e:
+        print(f"Error: cannot write journal {journal_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nApplying renames (journal: {journal_path})...\n")
+    success, fail = apply_renames(steps, journal, sidecar=args.trust_names != "off")
+
+    print(f"\nDone. Renamed: {success} | Failed: {fail}")
+
+
+def run_plan_file(args: argparse.Namespace) -> None:
+    """Handle --apply-plan."""
+    try:
+        plan = load_plan_file(args.apply_plan.expanduser())
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: cannot read plan {args.apply_plan}: {e}", file=sys.stderr)
+        sys.exit(1)
+    plan = resolve_collisions(plan)
+    print(f"Loaded {len(plan)} planned rename(s) from {args.apply_plan}.\n")
+    print_plan(plan)
+    rename_count = sum(1 for _, _, s in plan if s == "RENAME")
+    print(f"\nTotal: {len(plan)} | To rename: {rename_count} | Skipped: {len(plan) - rename_count}")
+    apply_plan(args, plan)
+
+
+def run_journal(args: argparse.Namespace) -> None:
+    """Handle --resume and --undo."""
+    journal_path = (args.resume or args.undo).expanduser()
+    try:
+        journal = RenameJournal.load(journal_path)
+    except OSError as e:
+        print(f"Error: cannot read journal {journal_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.undo:
+        if journal.status == "undone":
+            print(f"Error: journal {journal_path} is already undone", file=sys.stderr)
+            sys.exit(1)
+        print(f"\nUndoing renames from {journal_path}...\n")
+        success, fail = undo_renames(journal)
+        print(f"\nDone. Restored: {success} | Failed: {fail}")
+        return
+    if journal.status is not None:
+        print(f"Error: journal {journal_path} is already {journal.status}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nResuming renames from {journal_path}...\n")
+    success, fail = apply_renames(journal.steps, journal, resume=True, sidecar=args.trust_names != "off")
+    print(f"\nDone. Renamed: {success} | Failed: {fail}")
+
+
+def rename_folder(args: argparse.Namespace, start_time: float, records: PlanRecordWriter | None) -> None:
+    """Scan, probe, plan and (with --apply) rename the files in args.folder.
 
+    With a record writer, plan records are streamed to it as files are probed
+    and only entries to be renamed are kept in memory; otherwise the full plan
+    is printed as a table.
+    """
     folder: Path = args.folder.resolve()
     if not folder.is_dir():
         print(f"Error: {folder} is not a directory", file=sys.stderr)
@@ -136,63 +2975,126 @@ def main() -> None:
     ffprobe_path = check_ffprobe()
 
     extensions = tuple(ext.lstrip(".") for ext in args.ext)
-    files = collect_video_files(folder, extensions)
-    if not files:
-        print("No video files found.")
-        return
+    print("Scanning and probing duration and resolution...\n")
 
-    print(f"Found {len(files)} video file(s). Probing duration and resolution...\n")
+    progress = ProgressReporter() if args.progress else None
+    duplicates: list[tuple[Path, Path]] = []
 
-    def probe_file(filepath: Path) -> tuple[Path, Path | None, str]:
-        if ALREADY_TAGGED_RE.search(filepath.stem):
-            return (filepath, None, "SKIP (already tagged)")
-        
-        probe_result = probe_video(ffprobe_path, filepath)
-        if probe_result is None:
-            return (filepath, None, "SKIP (probe failed)")
-        
-        duration_min, width, height = probe_result
-        new_path = build_new_path(filepath, duration_min, width, height)
-        
-        if new_path == filepath:
-            return (filepath, None, "SKIP (already named)")
-        elif new_path.exists():
-            return (filepath, new_path, "SKIP (target exists)")
-        else:
-            return (filepath, new_path, "RENAME")
+    def record_duplicate(path: Path, original: Path) -> None:
+        duplicates.append((path, original))
 
-    results = []
-    if args.progress:
+    index = DirectoryIndex(args.index_path.expanduser()) if args.incremental else None
+
+    # st_dev of scanned paths not yet handed to the per-device scheduler.
+    walk_devices: dict[Path, int] | None = {} if args.per_device_jobs else None
+
+    def device(filepath: Path) -> int:
+        dev = walk_devices.pop(filepath, None)
+        return device_of(filepath) if dev is None else _whole_disk(dev)
+
+    def scan() -> Iterator[Path]:
+        for filepath in iter_unique_video_files(folder, extensions, record_duplicate, index, walk_devices):
+            if progress is not None:
+                progress.scanned += 1
+            yield filepath
+        if progress is not None:
+            progress.scan_done = True
+
+    cache = None if args.no_cache else ProbeCache(args.cache_path.expanduser())
+
+    fast = not args.ffprobe_only
+    xattrs = XattrCache() if xattrs_supported() and not args.no_xattrs else None
+    probe_file = functools.partial(
+        probe_file_entry, ffprobe_path, cache=cache, fast=fast, trust=args.trust_names, xattrs=xattrs
+    )
+    probe_file_async = functools.partial(
+        probe_file_entry_async, ffprobe_path, cache=cache, fast=fast, trust=args.trust_names, xattrs=xattrs
+    )
+
+    total = 0
+
+    def on_result(
+        outcome: tuple[tuple[Path, Path | None, str], tuple[int, int, int] | None], seconds: float
+    ) -> None:
+        nonlocal total
+        total += 1
+        if records is not None:
+            records.write("probe", outcome[0], outcome[1], seconds)
+        if progress is not None:
+            progress.update(outcome, seconds)
+
+    def keep(outcome: tuple[tuple[Path, Path | None, str], tuple[int, int, int] | None]) -> bool:
+        return records is None or outcome[0][2] == "RENAME"
+
+    controller = None
+    if args.adaptive:
+        controller = AdaptiveConcurrency(args.jobs or ADAPTIVE_MAX_JOBS)
+        jobs = controller.maximum
+    else:
+        jobs = args.jobs or (ASYNC_DEFAULT_JOBS if args.engine == "async" else None)
+
+    files: Iterable[Path] = scan()
+    if args.order == "physical":
+        # Every path must be known before the first probe, so streaming is given up.
+        files = physical_order(files)
+
+    if progress is not None:
         print("Processing files...")
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(probe_file, f): f for f in files}
-            completed = 0
-            total = len(files)
-            for future in futures:
-                result = future.result()
-                results.append(result)
-                completed += 1
-                if completed % 10 == 0 or completed == total:
-                    pct = (completed / total) * 100
-                    print(f"  Progress: {completed}/{total} ({pct:.1f}%)", end="\r")
-            print()  # New line after progress
+    if args.engine == "async":
+        outcomes = run_async(files, probe_file_async, jobs, on_result, keep, args.per_device_jobs, controller, device)
     else:
-        with ThreadPoolExecutor() as executor:
-            results = list(executor.map(probe_file, files))
+        outcomes = run_threaded(files, probe_file, jobs, on_result, keep, args.per_device_jobs, controller, device)
+    if progress is not None:
+        progress.finish()
+
+    if cache is not None:
+        cache.evict_vanished(folder)
+        cache.close()
+    if index is not None:
+        index.evict_unvisited(folder)
+        index.close()
 
-    plan: list[tuple[Path, Path | None, str]] = sorted(results, key=lambda p: str(p[0]))
+    if total == 0:
+        print("No video files found.")
+        return
+    print(f"Found {total} video file(s).\n")
+
+    probed = sorted((entry for entry, _ in outcomes), key=lambda p: str(p[0]))
+    plan = resolve_collisions(probed)
+
+    if records is not None:
+        probe_results = {entry[0]: probe_result for entry, probe_result in outcomes}
+        for before, entry in zip(probed, plan):
+            if entry[2] != before[2]:
+                records.write("plan", entry, probe_results[entry[0]])
+    del outcomes
 
     rename_count = sum(1 for _, _, s in plan if s == "RENAME")
-    skip_count = len(plan) - rename_count
+    skip_count = total - rename_count
 
-    print(f"{'STATUS':<22} {'OLD NAME':<50} {'NEW NAME'}")
-    print("-" * 130)
-    for old_path, new_path, status in plan:
-        old_name = old_path.name
-        new_name = new_path.name if new_path else "-"
-        print(f"{status:<22} {old_name:<50} {new_name}")
-    print("-" * 130)
-    print(f"\nTotal: {len(plan)} | To rename: {rename_count} | Skipped: {skip_count}")
+    if records is None:
+        print_plan(plan)
+    if duplicates:
+        print(f"\nIgnored {len(duplicates)} duplicate path(s) (hard links or symlinks to a listed file):")
+        for path, original in sorted(duplicates, key=lambda p: str(p[0])):
+            print(f"  {path.relative_to(folder)} = {original.relative_to(folder)}")
+    print(f"\nTotal: {total} | To rename: {rename_count} | Skipped: {skip_count}")
+    if cache is not None:
+        print(f"Cache: {cache.hits} hit(s) | {cache.misses} miss(es) | {cache.evicted} evicted")
+    if xattrs is not None:
+        print(f"Xattrs: {xattrs.hits} hit(s) | {xattrs.written} written")
+    if controller is not None:
+        print(controller.summary())
+    if index is not None:
+        print(f"Index: {index.reused} unchanged | {index.listed} listed director(ies)")
+
+    if args.plan_out is not None:
+        try:
+            written = write_plan_file(args.plan_out.expanduser(), plan)
+        except OSError as e:
+            print(f"Error: cannot write plan {args.plan_out}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Plan: {written} rename(s) written to {args.plan_out}")
 
     elapsed = time.time() - start_time
     print(f"Total runtime: {elapsed:.2f} seconds")
@@ -201,21 +3103,40 @@ def main() -> None:
         print("Add --apply to rename files.")
         return
 
-    print("\nApplying renames...\n")
-    success = 0
-    fail = 0
-    for old_path, new_path, status in plan:
-        if status != "RENAME" or new_path is None:
-            continue
-        try:
-            os.rename(str(old_path), str(new_path))
-            print(f"  OK  {old_path.name} -> {new_path.name}")
-            success += 1
-        except OSError as e:
-            print(f"  FAIL {old_path.name}: {e}")
-            fail += 1
+    apply_plan(args, plan)
 
-    print(f"\nDone. Renamed: {success} | Failed: {fail}")
+
+def main() -> None:
+    start_time = time.time()
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.per_device_jobs is not None and args.per_device_jobs < 1:
+        parser.error("--per-device-jobs must be at least 1")
+    if args.debounce < 0:
+        parser.error("--debounce must not be negative")
+    if args.folder is None and not (args.apply_plan or args.resume or args.undo):
+        parser.error("the following arguments are required: folder")
+
+    if args.format == "table":
+        records = None
+        output = contextlib.nullcontext()
+    else:
+        # Machine-readable formats own stdout; everything meant for people goes to stderr.
+        records = PlanRecordWriter(sys.stdout, args.format)
+        output = contextlib.redirect_stdout(sys.stderr)
+
+    with output:
+        print("Video File Auto Renamer - Starting...")
+        if args.watch:
+            watch_folder(args, records)
+        elif args.apply_plan:
+            run_plan_file(args)
+        elif args.resume or args.undo:
+            run_journal(args)
+        else:
+            rename_folder(args, start_time, records)
 
 
 if __name__ == "__main__":
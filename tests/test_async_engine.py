@@ -0,0 +1,44 @@
+"""Tests for the asyncio probe engine."""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+FAKE_FFPROBE = REPO / "benchmarks" / "fake_ffprobe.py"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs SIGINT delivery to a child process")
+@pytest.mark.parametrize("extra", [[], ["--per-device-jobs", "2"], ["--adaptive"]])
+def test_sigint_exits(tmp_path: Path, extra: list[str]) -> None:
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    for i in range(600):
+        (folder / f"video_{i}.mkv").touch()
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "ffprobe").symlink_to(FAKE_FFPROBE)
+    env = dict(os.environ, PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}", FAKE_FFPROBE_LATENCY="0.5")
+
+    proc = subprocess.Popen(
+        [sys.executable, str(REPO / "rename_videos.py"), str(folder), "--engine", "async", "--jobs", "8",
+         "--no-cache", "--no-xattrs", *extra],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # A shell running the suite in the background may have SIGINT ignored.
+        preexec_fn=lambda: signal.signal(signal.SIGINT, signal.SIG_DFL),
+    )
+    time.sleep(1.5)
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        pytest.fail("rename_videos.py kept running after SIGINT")
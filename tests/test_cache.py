@@ -0,0 +1,89 @@
+"""Tests for the SQLite probe cache keyed by file identity."""
+
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from rename_videos import ProbeCache
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> Iterator[ProbeCache]:
+    cache = ProbeCache(tmp_path / "cache" / "probe.sqlite3")
+    yield cache
+    cache.close()
+
+
+def video(folder: Path, name: str) -> Path:
+    folder.mkdir(exist_ok=True)
+    path = folder / name
+    path.write_bytes(b"\0" * 64)
+    return path
+
+
+def test_round_trip(tmp_path: Path, cache: ProbeCache) -> None:
+    path = video(tmp_path / "videos", "a.mp4")
+    assert cache.get(path, path.stat()) is None
+    cache.put(path, path.stat(), (45, 1920, 1080))
+    assert cache.get(path, path.stat()) == (45, 1920, 1080)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_survives_reopening(tmp_path: Path) -> None:
+    path = video(tmp_path / "videos", "a.mp4")
+    db = tmp_path / "probe.sqlite3"
+    first = ProbeCache(db)
+    first.put(path, path.stat(), (45, 1920, 1080))
+    first.close()
+    second = ProbeCache(db)
+    assert second.get(path, path.stat()) == (45, 1920, 1080)
+    second.close()
+
+
+def test_hit_after_rename(tmp_path: Path, cache: ProbeCache) -> None:
+    path = video(tmp_path / "videos", "a.mp4")
+    cache.put(path, path.stat(), (45, 1920, 1080))
+    renamed = path.rename(path.with_name("a_45min_1920x1080.mp4"))
+    assert cache.get(renamed, renamed.stat()) == (45, 1920, 1080)
+
+    # The stored path follows the rename, so eviction does not drop the entry.
+    cache.evict_vanished(tmp_path / "videos")
+    assert cache.evicted == 0
+
+
+def test_miss_after_modification(tmp_path: Path, cache: ProbeCache) -> None:
+    path = video(tmp_path / "videos", "a.mp4")
+    cache.put(path, path.stat(), (45, 1920, 1080))
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert cache.get(path, path.stat()) is None
+
+    path.write_bytes(b"\0" * 64)
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000_000))
+    assert cache.get(path, path.stat()) is None
+
+
+def test_evict_vanished(tmp_path: Path) -> None:
+    db = tmp_path / "probe.sqlite3"
+    kept = video(tmp_path / "videos", "kept.mp4")
+    deleted = video(tmp_path / "videos", "deleted.mp4")
+    outside = video(tmp_path / "other", "outside.mp4")
+    cache = ProbeCache(db)
+    for path in (kept, deleted, outside):
+        cache.put(path, path.stat(), (1, 640, 360))
+    cache.close()
+    deleted_st = deleted.stat()
+    deleted.unlink()
+    outside_st = outside.stat()
+    outside.unlink()
+
+    # A new run that saw no files yet: only the vanished file under the folder goes.
+    cache = ProbeCache(db)
+    cache.evict_vanished(tmp_path / "videos")
+    assert cache.evicted == 1
+    assert cache.get(kept, kept.stat()) == (1, 640, 360)
+    assert cache.get(deleted, deleted_st) is None
+    assert cache.get(outside, outside_st) == (1, 640, 360)
+    cache.close()
@@ -0,0 +1,41 @@
+"""Tests for walking a folder and de-duplicating video files by inode."""
+
+import os
+from pathlib import Path
+
+from rename_videos import collect_video_files, iter_unique_video_files
+
+EXTENSIONS = ("mp4", "mkv")
+
+
+def test_hard_links_and_symlinks_are_yielded_once(tmp_path: Path) -> None:
+    (tmp_path / "sub").mkdir()
+    original = tmp_path / "a.mp4"
+    original.write_bytes(b"A")
+    os.link(original, tmp_path / "sub" / "hard.mp4")
+    (tmp_path / "sub" / "soft.mkv").symlink_to(original)
+    (tmp_path / "b.MKV").write_bytes(b"B")
+    (tmp_path / "notes.txt").write_bytes(b"")
+
+    duplicates: list[tuple[Path, Path]] = []
+    devices: dict[Path, int] = {}
+    files = list(iter_unique_video_files(tmp_path, EXTENSIONS, lambda f, o: duplicates.append((f, o)), devices=devices))
+
+    aliases = {original, tmp_path / "sub" / "hard.mp4", tmp_path / "sub" / "soft.mkv"}
+    assert len(files) == 2
+    assert tmp_path / "b.MKV" in files
+    [kept] = [f for f in files if f in aliases]
+    assert sorted(duplicates) == sorted((alias, kept) for alias in aliases - {kept})
+    assert devices == {f: f.stat().st_dev for f in files}
+
+
+def test_symlinked_directories_are_not_descended(tmp_path: Path) -> None:
+    (tmp_path / "real").mkdir()
+    (tmp_path / "real" / "a.mp4").write_bytes(b"A")
+    (tmp_path / "link").symlink_to(tmp_path / "real", target_is_directory=True)
+
+    duplicates: list[tuple[Path, Path]] = []
+    assert collect_video_files(tmp_path, EXTENSIONS, lambda f, o: duplicates.append((f, o))) == [
+        tmp_path / "real" / "a.mp4"
+    ]
+    assert duplicates == []
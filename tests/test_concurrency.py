@@ -0,0 +1,108 @@
+"""Tests for scheduling probes across disks and for the number of probes in flight."""
+
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import rename_videos
+from rename_videos import AdaptiveConcurrency, DeviceQueue, run_threaded
+
+
+def disk(path: Path) -> int:
+    """Stand-in device lookup: files under "0/" are on disk 0, and so on."""
+    return int(path.parent.name)
+
+
+def test_device_queue_limit_and_round_robin() -> None:
+    queue = DeviceQueue(2, disk)
+    for name in ("0/a", "0/b", "0/c", "1/x"):
+        queue.add(Path(name))
+    assert len(queue) == 4
+
+    assert [queue.pop_ready() for _ in range(3)] == [Path("0/a"), Path("1/x"), Path("0/b")]
+    # Disk 0 has two probes in flight and disk 1 has nothing queued.
+    assert queue.pop_ready() is None
+    assert len(queue) == 1
+
+    queue.release(Path("1/x"))
+    assert queue.pop_ready() is None
+    queue.release(Path("0/a"))
+    assert queue.pop_ready() == Path("0/c")
+    assert len(queue) == 0
+    assert queue.pop_ready() is None
+
+
+def test_run_threaded_per_device_limit() -> None:
+    files = [Path(f"{dev}/{i}") for i in range(12) for dev in (0, 1, 2)]
+    lock = threading.Lock()
+    running: Counter[int] = Counter()
+    peak: Counter[int] = Counter()
+
+    def probe(path: Path) -> Path:
+        with lock:
+            running[disk(path)] += 1
+            peak[disk(path)] = max(peak[disk(path)], running[disk(path)])
+        time.sleep(0.005)
+        with lock:
+            running[disk(path)] -= 1
+        return path
+
+    results = run_threaded(iter(files), probe, jobs=16, per_device=2, device=disk)
+    assert sorted(results) == sorted(files)
+    assert set(peak) == {0, 1, 2}
+    assert max(peak.values()) <= 2
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rename_videos.time, "perf_counter", clock)
+    return clock
+
+
+def window(controller: AdaptiveConcurrency, clock: Clock, rate: int, latency: float, saturated: bool = True) -> int:
+    """Record one second with rate probes of the given latency; return the limit afterwards."""
+    in_flight = controller.limit if saturated else controller.limit - 1
+    for _ in range(rate - 1):
+        controller.record(latency, in_flight)
+    clock.now += 1.0
+    controller.record(latency, in_flight)
+    return controller.limit
+
+
+def test_adaptive_slow_start(clock: Clock) -> None:
+    controller = AdaptiveConcurrency(20)
+    assert [window(controller, clock, rate, 0.1) for rate in (40, 80, 160, 320)] == [8, 16, 20, 20]
+
+
+def test_adaptive_backs_off_when_saturated(clock: Clock) -> None:
+    controller = AdaptiveConcurrency(64)
+    assert window(controller, clock, 40, 0.1) == 8
+    assert window(controller, clock, 80, 0.1) == 16
+    # Twice the probes in flight bring no more files/s, only slower probes.
+    assert window(controller, clock, 80, 0.2) == 11
+    # After the first back-off the limit grows by one per window.
+    assert window(controller, clock, 85, 0.1) == 12
+    assert controller.summary() == "Concurrency: settled at 12 in flight (history: 4 -> 8 -> 16 -> 11 -> 12)"
+
+
+def test_adaptive_ignores_unsaturated_windows(clock: Clock) -> None:
+    controller = AdaptiveConcurrency(64)
+    assert window(controller, clock, 40, 0.1, saturated=False) == 4
+    # Too few samples to close a window, however long it took.
+    for _ in range(7):
+        clock.now += 1.0
+        controller.record(0.1, controller.limit)
+    assert controller.limit == 4
+    assert len(controller.history) == 1
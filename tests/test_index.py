@@ -0,0 +1,83 @@
+"""Tests for the --incremental directory index."""
+
+import os
+import shutil
+import time
+from pathlib import Path
+
+from rename_videos import DirectoryIndex, collect_video_files
+
+EXTENSIONS = ("mp4", "mkv")
+SUFFIX_KEY = "mkv,mp4"
+
+
+def make_tree(root: Path) -> None:
+    (root / "sub").mkdir(parents=True)
+    (root / "a.mp4").write_bytes(b"A")
+    (root / "notes.txt").write_bytes(b"")
+    (root / "sub" / "b.MKV").write_bytes(b"B")
+
+
+def backdate(root: Path, seconds: int) -> None:
+    """Set every directory's mtime into the past, so its listing is not racy."""
+    mtime_ns = time.time_ns() - seconds * 1_000_000_000
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, ns=(mtime_ns, mtime_ns))
+
+
+def scan(root: Path, db: Path) -> tuple[list[Path], int, int]:
+    """Walk root with the index at db; return the files and the reused and listed counts."""
+    index = DirectoryIndex(db)
+    try:
+        files = collect_video_files(root, EXTENSIONS, index=index)
+        index.evict_unvisited(root)
+    finally:
+        index.close()
+    return files, index.reused, index.listed
+
+
+def test_unchanged_directories_are_reused(tmp_path: Path) -> None:
+    root, db = tmp_path / "videos", tmp_path / "index.sqlite3"
+    make_tree(root)
+    backdate(root, 60)
+    expected = [root / "a.mp4", root / "sub" / "b.MKV"]
+
+    assert scan(root, db) == (expected, 0, 2)
+    assert scan(root, db) == (expected, 2, 0)
+    assert collect_video_files(root, EXTENSIONS) == expected
+
+
+def test_changed_directory_is_listed_again(tmp_path: Path) -> None:
+    root, db = tmp_path / "videos", tmp_path / "index.sqlite3"
+    make_tree(root)
+    backdate(root, 60)
+    scan(root, db)
+
+    (root / "sub" / "c.mp4").write_bytes(b"C")
+    os.utime(root / "sub", ns=(time.time_ns() - 30_000_000_000,) * 2)
+    assert scan(root, db) == ([root / "a.mp4", root / "sub" / "b.MKV", root / "sub" / "c.mp4"], 1, 1)
+
+
+def test_racy_directories_are_not_stored(tmp_path: Path) -> None:
+    root, db = tmp_path / "videos", tmp_path / "index.sqlite3"
+    make_tree(root)
+    scan(root, db)
+    assert scan(root, db)[1:] == (0, 2)
+
+
+def test_unvisited_directories_are_evicted(tmp_path: Path) -> None:
+    root, db = tmp_path / "videos", tmp_path / "index.sqlite3"
+    make_tree(root)
+    backdate(root, 60)
+    scan(root, db)
+    sub_mtime_ns = (root / "sub").stat().st_mtime_ns
+
+    shutil.rmtree(root / "sub")
+    backdate(root, 30)
+    assert scan(root, db) == ([root / "a.mp4"], 0, 1)
+
+    index = DirectoryIndex(db)
+    assert index.get(str(root / "sub"), sub_mtime_ns, SUFFIX_KEY) is None
+    st = (root / "a.mp4").stat()
+    assert index.get(str(root), root.stat().st_mtime_ns, SUFFIX_KEY) == ([], [["a.mp4", st.st_dev, st.st_ino]])
+    index.close()
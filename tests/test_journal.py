@@ -0,0 +1,143 @@
+"""Tests for the rename journal, --resume and --undo."""
+
+import argparse
+import os
+from pathlib import Path
+
+import pytest
+
+import rename_videos
+from rename_videos import (
+    JOURNAL_BATCH,
+    RenameJournal,
+    apply_renames,
+    order_renames,
+    resolve_collisions,
+    run_journal,
+    undo_renames,
+)
+
+# Two files swapping names, plus a chain c -> d -> e.
+CONTENTS = {"a.mp4": "A", "b.mp4": "B", "c.mp4": "C", "d.mp4": "D"}
+RENAMES = {"a.mp4": "b.mp4", "b.mp4": "a.mp4", "c.mp4": "d.mp4", "d.mp4": "e.mp4"}
+EXPECTED = {"a.mp4": "B", "b.mp4": "A", "d.mp4": "C", "e.mp4": "D"}
+
+
+class Crash(Exception):
+    """Stands in for the process dying in the middle of a run."""
+
+
+def make_steps(folder: Path) -> list[tuple[Path, Path, Path, bool]]:
+    folder.mkdir()
+    for name, content in CONTENTS.items():
+        (folder / name).write_text(content)
+    return order_renames(resolve_collisions([(folder / old, folder / new, "RENAME") for old, new in RENAMES.items()]))
+
+
+def read_tree(folder: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in folder.iterdir() if path.name != ".videoname.json"}
+
+
+def test_journal_round_trip(tmp_path: Path) -> None:
+    steps = make_steps(tmp_path / "videos")
+    journal_path = tmp_path / "journal.jsonl"
+    apply_renames(steps, RenameJournal.create(journal_path, steps))
+
+    journal = RenameJournal.load(journal_path)
+    assert journal.steps == steps
+    assert journal.applied == set(range(len(steps)))
+    assert journal.status == "complete"
+
+
+def test_journal_ignores_torn_last_line(tmp_path: Path) -> None:
+    steps = make_steps(tmp_path / "videos")
+    journal_path = tmp_path / "journal.jsonl"
+    RenameJournal.create(journal_path, steps)._file.close()
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"done": [0, ')
+
+    journal = RenameJournal.load(journal_path)
+    assert journal.steps == steps
+    assert journal.applied == set()
+    assert journal.status is None
+
+
+@pytest.mark.parametrize("crash_after", [1, 2, 3, 4])
+def test_resume_after_crash(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, crash_after: int) -> None:
+    folder = tmp_path / "videos"
+    steps = make_steps(folder)
+    journal_path = tmp_path / "journal.jsonl"
+
+    real_rename = os.rename
+    calls = 0
+
+    def crashing_rename(src: str, dst: str) -> None:
+        nonlocal calls
+        if calls == crash_after:
+            raise Crash
+        calls += 1
+        real_rename(src, dst)
+
+    monkeypatch.setattr(rename_videos.os, "rename", crashing_rename)
+    with pytest.raises(Crash):
+        apply_renames(steps, RenameJournal.create(journal_path, steps))
+    monkeypatch.setattr(rename_videos.os, "rename", real_rename)
+
+    journal = RenameJournal.load(journal_path)
+    assert journal.status is None
+    renamed, failed = apply_renames(journal.steps, journal, resume=True)
+    assert (renamed, failed) == (4, 0)
+    assert read_tree(folder) == EXPECTED
+    assert RenameJournal.load(journal_path).status == "complete"
+
+
+def test_resume_skips_batches_marked_done(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    count = JOURNAL_BATCH + 3
+    for i in range(count):
+        (folder / f"{i}.mp4").touch()
+    steps = order_renames([(folder / f"{i}.mp4", folder / f"{i}_new.mp4", "RENAME") for i in range(count)])
+    journal_path = tmp_path / "journal.jsonl"
+    journal = RenameJournal.create(journal_path, steps)
+    for _, src, dst, _ in steps[:JOURNAL_BATCH]:
+        os.rename(src, dst)
+    journal.mark_done(0, JOURNAL_BATCH)
+    journal._file.close()
+
+    # Only the second batch is renamed; the first is not even checked on disk.
+    renamed, failed = apply_renames(steps, RenameJournal.load(journal_path), resume=True)
+    assert (renamed, failed) == (3, 0)
+    names = sorted(p.name for p in folder.iterdir() if p.suffix == ".mp4")
+    assert names == sorted(f"{i}_new.mp4" for i in range(count))
+
+
+def test_undo(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    steps = make_steps(folder)
+    journal_path = tmp_path / "journal.jsonl"
+    apply_renames(steps, RenameJournal.create(journal_path, steps))
+    assert read_tree(folder) == EXPECTED
+
+    restored, failed = undo_renames(RenameJournal.load(journal_path))
+    assert (restored, failed) == (4, 0)
+    assert read_tree(folder) == CONTENTS
+    assert RenameJournal.load(journal_path).status == "undone"
+
+    # A second undo would swap a and b back, so it is refused.
+    with pytest.raises(SystemExit):
+        run_journal(argparse.Namespace(undo=journal_path, resume=None, trust_names="off"))
+    assert read_tree(folder) == CONTENTS
+
+
+def test_undo_never_overwrites(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    steps = make_steps(folder)
+    journal_path = tmp_path / "journal.jsonl"
+    apply_renames(steps, RenameJournal.create(journal_path, steps))
+    (folder / "c.mp4").write_text("new file")
+
+    # c's name is taken again, so the chain c -> d -> e stays; the swap is reverted.
+    restored, failed = undo_renames(RenameJournal.load(journal_path))
+    assert (restored, failed) == (2, 0)
+    assert read_tree(folder) == {"a.mp4": "A", "b.mp4": "B", "c.mp4": "new file", "d.mp4": "C", "e.mp4": "D"}
@@ -0,0 +1,80 @@
+"""Tests for the NDJSON and CSV plan records written with --format."""
+
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from rename_videos import PlanRecordWriter
+from test_parsers import mp4
+
+REPO = Path(__file__).resolve().parent.parent
+FAKE_FFPROBE = REPO / "benchmarks" / "fake_ffprobe.py"
+
+
+def test_ndjson(tmp_path: Path) -> None:
+    stream = io.StringIO()
+    writer = PlanRecordWriter(stream, "ndjson")
+    writer.write("probe", (tmp_path / "电影.mp4", tmp_path / "电影_640x360.mp4", "RENAME"), (5, 640, 360), 0.123456)
+    writer.write("probe", (tmp_path / "b.mp4", None, "SKIP (probe failed)"))
+    first, second = (json.loads(line) for line in stream.getvalue().splitlines())
+    assert first == {
+        "event": "probe",
+        "old": str(tmp_path / "电影.mp4"),
+        "new": str(tmp_path / "电影_640x360.mp4"),
+        "status": "RENAME",
+        "duration_min": 5,
+        "width": 640,
+        "height": 360,
+        "probe_seconds": 0.1235,
+    }
+    assert (second["new"], second["duration_min"], second["probe_seconds"]) == (None, None, None)
+
+
+def test_csv(tmp_path: Path) -> None:
+    stream = io.StringIO()
+    writer = PlanRecordWriter(stream, "csv")
+    writer.write("plan", (tmp_path / "a, b.mp4", tmp_path / "a, b_640x360.mp4", "SKIP (collision)"), (5, 640, 360))
+    writer.write("probe", (tmp_path / "c.mp4", None, "SKIP (probe failed)"))
+    rows = list(csv.reader(io.StringIO(stream.getvalue())))
+    assert rows == [
+        list(PlanRecordWriter.FIELDS),
+        ["plan", str(tmp_path / "a, b.mp4"), str(tmp_path / "a, b_640x360.mp4"), "SKIP (collision)"]
+        + ["5", "640", "360", ""],
+        ["probe", str(tmp_path / "c.mp4"), "", "SKIP (probe failed)", "", "", "", ""],
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_plan_record_follows_a_changed_status(tmp_path: Path, fmt: str) -> None:
+    # The header parser reads these files; ffprobe only has to be on PATH.
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "ffprobe").symlink_to(FAKE_FFPROBE)
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    for name in ("x.mp4", "x.MP4"):
+        (folder / name).write_bytes(mp4(1000, 5 * 60 * 1000, 640, 360))
+    result = subprocess.run(
+        [sys.executable, str(REPO / "rename_videos.py"), str(folder), "--format", fmt, "--no-cache", "--no-xattrs"],
+        env=dict(os.environ, PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    if fmt == "ndjson":
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+    else:
+        records = list(csv.DictReader(io.StringIO(result.stdout)))
+    assert sorted(r["event"] for r in records) == ["plan", "probe", "probe"]
+    assert all(r["status"] == "RENAME" for r in records if r["event"] == "probe")
+
+    # The last record per file is authoritative: exactly one of the two is skipped.
+    last = {r["old"]: r["status"] for r in records}
+    assert sorted(last.values()) == ["RENAME", "SKIP (collision)"]
+    assert "Total:" in result.stderr
@@ -0,0 +1,389 @@
+"""Tests for the in-process container header parsers, on hand-built headers."""
+
+import struct
+from pathlib import Path
+
+import pytest
+
+from rename_videos import (
+    ASF_FILE_PROPERTIES,
+    ASF_HEADER,
+    ASF_STREAM_PROPERTIES,
+    ASF_VIDEO_MEDIA,
+    EBML_DOCTYPE,
+    EBML_HEADER,
+    MKV_CLUSTER,
+    MKV_DURATION,
+    MKV_INFO,
+    MKV_PIXEL_HEIGHT,
+    MKV_PIXEL_WIDTH,
+    MKV_SEEK,
+    MKV_SEEKHEAD,
+    MKV_SEEK_ID,
+    MKV_SEEK_POSITION,
+    MKV_SEGMENT,
+    MKV_TIMECODE_SCALE,
+    MKV_TRACKS,
+    MKV_TRACK_ENTRY,
+    MKV_TRACK_TYPE,
+    MKV_VIDEO,
+    TS_STREAM_H264,
+    TS_STREAM_HEVC,
+    TS_STREAM_MPEG2,
+    TS_TIMESTAMP_WRAP,
+    probe_asf,
+    probe_avi,
+    probe_flv,
+    probe_header,
+    probe_matroska,
+    probe_mp4,
+    probe_mpegts,
+)
+
+
+def write(tmp_path: Path, name: str, data: bytes) -> Path:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+# MP4
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mp4(timescale: int, duration: int, width: int, height: int, handler: bytes = b"vide") -> bytes:
+    mvhd = box(b"mvhd", b"\0" * 12 + struct.pack(">II", timescale, duration) + b"\0" * 80)
+    hdlr = box(b"hdlr", b"\0" * 8 + handler + b"\0" * 13)
+    # VisualSampleEntry: 6 reserved bytes, data reference index, 16 predefined bytes, then the size.
+    entry = box(b"avc1", b"\0" * 24 + struct.pack(">HH", width, height) + b"\0" * 50)
+    stsd = box(b"stsd", struct.pack(">II", 0, 1) + entry)
+    trak = box(b"trak", box(b"mdia", hdlr + box(b"minf", box(b"stbl", stsd))))
+    return box(b"ftyp", b"isom\0\0\0\0") + box(b"moov", mvhd + trak) + box(b"mdat", b"\0" * 64)
+
+
+def test_mp4(tmp_path: Path) -> None:
+    path = write(tmp_path, "a.mp4", mp4(1000, 45 * 60 * 1000, 1920, 1080))
+    assert probe_mp4(path) == (45, 1920, 1080)
+
+
+def test_mp4_without_video_track(tmp_path: Path) -> None:
+    assert probe_mp4(write(tmp_path, "a.mp4", mp4(1000, 60_000, 0, 0, handler=b"soun"))) is None
+
+
+def test_mp4_unknown_duration(tmp_path: Path) -> None:
+    assert probe_mp4(write(tmp_path, "a.mp4", mp4(1000, 0xFFFFFFFF, 1280, 720))) is None
+
+
+# Matroska
+
+
+def ebml(element_id: int, data: bytes) -> bytes:
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + ((1 << 56) | len(data)).to_bytes(8, "big") + data
+
+
+def mkv_info(milliseconds: float) -> bytes:
+    scale = ebml(MKV_TIMECODE_SCALE, (1_000_000).to_bytes(3, "big"))
+    return ebml(MKV_INFO, scale + ebml(MKV_DURATION, struct.pack(">d", milliseconds)))
+
+
+def mkv_tracks(width: int, height: int) -> bytes:
+    audio = ebml(MKV_TRACK_ENTRY, ebml(MKV_TRACK_TYPE, b"\x02"))
+    video_size = ebml(MKV_PIXEL_WIDTH, width.to_bytes(2, "big")) + ebml(MKV_PIXEL_HEIGHT, height.to_bytes(2, "big"))
+    video = ebml(MKV_TRACK_ENTRY, ebml(MKV_TRACK_TYPE, b"\x01") + ebml(MKV_VIDEO, video_size))
+    return ebml(MKV_TRACKS, audio + video)
+
+
+def matroska(segment: bytes, doctype: bytes = b"matroska") -> bytes:
+    return ebml(EBML_HEADER, ebml(EBML_DOCTYPE, doctype)) + ebml(MKV_SEGMENT, segment)
+
+
+def test_matroska(tmp_path: Path) -> None:
+    data = matroska(mkv_info(90 * 60 * 1000.0) + mkv_tracks(1280, 720))
+    assert probe_matroska(write(tmp_path, "a.mkv", data)) == (90, 1280, 720)
+
+
+def test_matroska_tracks_after_cluster(tmp_path: Path) -> None:
+    info = mkv_info(30 * 60 * 1000.0)
+    cluster = ebml(MKV_CLUSTER, b"\0" * 32)
+
+    def seekhead(position: int) -> bytes:
+        seek = ebml(MKV_SEEK_ID, MKV_TRACKS.to_bytes(4, "big")) + ebml(MKV_SEEK_POSITION, position.to_bytes(8, "big"))
+        return ebml(MKV_SEEKHEAD, ebml(MKV_SEEK, seek))
+
+    position = len(seekhead(0)) + len(info) + len(cluster)
+    data = matroska(seekhead(position) + info + cluster + mkv_tracks(3840, 2160), doctype=b"webm")
+    assert probe_matroska(write(tmp_path, "a.webm", data)) == (30, 3840, 2160)
+
+
+@pytest.mark.parametrize("milliseconds", [float("inf"), float("nan"), -1.0, 1e308])
+def test_matroska_implausible_duration(tmp_path: Path, milliseconds: float) -> None:
+    path = write(tmp_path, "a.mkv", matroska(mkv_info(milliseconds) + mkv_tracks(1280, 720)))
+    assert probe_matroska(path) is None
+    assert probe_header(path) is None
+
+
+def test_matroska_wrong_doctype(tmp_path: Path) -> None:
+    data = matroska(mkv_info(60_000.0) + mkv_tracks(640, 360), doctype=b"other")
+    assert probe_matroska(write(tmp_path, "a.mkv", data)) is None
+
+
+# AVI
+
+
+def chunk(fourcc: bytes, payload: bytes) -> bytes:
+    return struct.pack("<4sI", fourcc, len(payload)) + payload + b"\0" * (len(payload) & 1)
+
+
+def riff_list(list_type: bytes, payload: bytes) -> bytes:
+    return chunk(b"LIST", list_type + payload)
+
+
+def avi(frames: int, width: int, height: int, avih_size: tuple[int, int] | None = None) -> bytes:
+    avih_width, avih_height = avih_size or (width, height)
+    avih = struct.pack("<10I", 40_000, 0, 0, 0, frames, 0, 1, 0, avih_width, avih_height) + b"\0" * 16
+    # 25 frames per second: dwScale 1, dwRate 25.
+    strh = struct.pack("<4s4sIHHIIIII", b"vids", b"H264", 0, 0, 0, 0, 1, 25, 0, frames) + b"\0" * 20
+    strf = struct.pack("<Iii", 40, width, -height) + b"\0" * 28
+    hdrl = riff_list(b"hdrl", chunk(b"avih", avih) + riff_list(b"strl", chunk(b"strh", strh) + chunk(b"strf", strf)))
+    body = b"AVI " + hdrl + riff_list(b"movi", b"")
+    return struct.pack("<4sI", b"RIFF", len(body)) + body
+
+
+def test_avi(tmp_path: Path) -> None:
+    assert probe_avi(write(tmp_path, "a.avi", avi(25 * 60 * 30, 720, 404))) == (30, 720, 404)
+
+
+def test_avi_size_mismatch(tmp_path: Path) -> None:
+    assert probe_avi(write(tmp_path, "a.avi", avi(25 * 60, 720, 404, avih_size=(640, 360)))) is None
+
+
+# FLV
+
+
+def amf_string(value: str) -> bytes:
+    encoded = value.encode()
+    return struct.pack(">H", len(encoded)) + encoded
+
+
+def flv(metadata: dict[str, float]) -> bytes:
+    array = b"\x08" + struct.pack(">I", len(metadata))
+    for key, value in metadata.items():
+        array += amf_string(key) + b"\x00" + struct.pack(">d", value)
+    array += b"\0\0\x09"
+    payload = b"\x02" + amf_string("onMetaData") + array
+    tag = bytes([18]) + len(payload).to_bytes(3, "big") + b"\0" * 7 + payload
+    header = b"FLV\x01\x05" + struct.pack(">I", 9) + b"\0" * 4
+    return header + tag + struct.pack(">I", len(tag)) + bytes([9]) + b"\0" * 15
+
+
+def test_flv(tmp_path: Path) -> None:
+    data = flv({"duration": 125.0 * 60, "width": 1920.0, "height": 1080.0, "framerate": 30.0})
+    assert probe_flv(write(tmp_path, "a.flv", data)) == (125, 1920, 1080)
+
+
+def test_flv_missing_size(tmp_path: Path) -> None:
+    assert probe_flv(write(tmp_path, "a.flv", flv({"duration": 60.0}))) is None
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {"duration": float("inf"), "width": 1920.0, "height": 1080.0},
+        {"duration": float("nan"), "width": 1920.0, "height": 1080.0},
+        {"duration": 60.0, "width": 1e300, "height": 1080.0},
+        {"duration": 1e12, "width": 1920.0, "height": 1080.0},
+        {"duration": 60.0, "width": 0.5, "height": 1080.0},
+    ],
+)
+def test_flv_implausible_metadata(tmp_path: Path, metadata: dict[str, float]) -> None:
+    path = write(tmp_path, "a.flv", flv(metadata))
+    assert probe_flv(path) is None
+    assert probe_header(path) is None
+
+
+# MPEG-TS
+
+VIDEO_PID = 0x101
+
+
+def ue(value: int) -> str:
+    code = value + 1
+    return "0" * (code.bit_length() - 1) + format(code, "b")
+
+
+def rbsp(bits: str) -> bytes:
+    """Close a parameter set with the stop bit and add emulation prevention bytes."""
+    bits += "1" + "0" * (-(len(bits) + 1) % 8)
+    out = bytearray()
+    zeros = 0
+    for byte in int(bits, 2).to_bytes(len(bits) // 8, "big"):
+        if zeros >= 2 and byte <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def h264_es(width: int, height: int) -> bytes:
+    # Baseline profile, 4:2:0 and frame_mbs_only, so the height is cropped in steps of 2 lines.
+    mbs_high = (height + 15) // 16
+    bits = format(66, "08b") + format(40, "016b") + ue(0) + ue(0) + ue(2) + ue(1) + "0"
+    bits += ue(width // 16 - 1) + ue(mbs_high - 1) + "1" + "1"
+    bits += "1" + ue(0) + ue(0) + ue(0) + ue((mbs_high * 16 - height) // 2) + "0"
+    return b"\0\0\1\x67" + rbsp(bits) + b"\0\0\1\x09\xf0"
+
+
+def hevc_es(width: int, height: int) -> bytes:
+    bits = "0000" + "000" + "1" + "0" * 88 + format(93, "08b") + ue(0) + ue(1) + ue(width) + ue(height) + "0"
+    return b"\0\0\1\x42\x01" + rbsp(bits) + b"\0\0\1\x46\x01\x50"
+
+
+def mpeg2_es(width: int, height: int) -> bytes:
+    return b"\0\0\1\xb3" + ((width << 12) | height).to_bytes(3, "big") + b"\x13\xff\xff\xe0"
+
+
+def ts_packet(pid: int, payload: bytes = b"", unit_start: bool = False, pcr: int | None = None) -> bytes:
+    """Build one 188-byte packet, filling the space after a short payload with adaptation stuffing."""
+    space = 184 - len(payload)
+    control = 0x10
+    adaptation = b""
+    if pcr is not None or space:
+        fields = b"\0"
+        if pcr is not None:
+            fields = b"\x10" + (pcr >> 1).to_bytes(4, "big") + bytes([(pcr & 1) << 7 | 0x7E, 0])
+        adaptation = bytes([space - 1]) + (fields + b"\xff" * space)[: space - 1]
+        control |= 0x20
+    header = struct.pack(">BHB", 0x47, (0x4000 if unit_start else 0) | pid, control)
+    return header + adaptation + payload
+
+
+def psi(table_id: int, body: bytes) -> bytes:
+    # Pointer field, then the section with a CRC the parser does not check.
+    return b"\0" + struct.pack(">BH", table_id, 0xB000 | (len(body) + 4)) + body + b"\0" * 4
+
+
+def pes(pts: int | None, es: bytes) -> bytes:
+    if pts is None:
+        return b"\0\0\1\xe0\0\0\x80\0\0" + es
+    timestamp = bytes(
+        [
+            0x21 | (pts >> 29) & 0x0E,
+            (pts >> 22) & 0xFF,
+            0x01 | (pts >> 14) & 0xFE,
+            (pts >> 7) & 0xFF,
+            0x01 | (pts << 1) & 0xFE,
+        ]
+    )
+    return b"\0\0\1\xe0\0\0\x80\x80\x05" + timestamp + es
+
+
+def mpegts(
+    stream_type: int,
+    es: bytes,
+    pts: tuple[int | None, int | None],
+    pcr: tuple[int, int] | None = None,
+    padding: int = 2000,
+    packet_size: int = 188,
+) -> bytes:
+    """Build a stream with PAT, PMT (audio first, then video), a first and a last video PES and null packets."""
+    pat = ts_packet(0, psi(0x00, struct.pack(">HBBBHH", 1, 0xC1, 0, 0, 1, 0xE100)), unit_start=True)
+    streams = struct.pack(">BHH", 0x0F, 0xE102, 0xF000) + struct.pack(">BHH", stream_type, 0xE000 | VIDEO_PID, 0xF000)
+    pmt_body = struct.pack(">HBBBHH", 1, 0xC1, 0, 0, 0xE000 | VIDEO_PID, 0xF000) + streams
+    pmt = ts_packet(0x100, psi(0x02, pmt_body), unit_start=True)
+    first_pcr, last_pcr = pcr or (None, None)
+    first = ts_packet(VIDEO_PID, pes(pts[0], es), unit_start=True, pcr=first_pcr)
+    last = ts_packet(VIDEO_PID, pes(pts[1], b""), unit_start=True, pcr=last_pcr)
+    null = ts_packet(0x1FFF, b"\xff" * 184)
+    packets = [pat, pmt, first] + [null] * padding + [last]
+    prefix = b"\0" * (packet_size - 188)
+    return b"".join(prefix + packet for packet in packets)
+
+
+@pytest.mark.parametrize(
+    ("stream_type", "es"),
+    [
+        (TS_STREAM_H264, h264_es(1920, 1080)),
+        (TS_STREAM_HEVC, hevc_es(1280, 720)),
+        (TS_STREAM_MPEG2, mpeg2_es(720, 576)),
+    ],
+)
+def test_mpegts(tmp_path: Path, stream_type: int, es: bytes) -> None:
+    path = write(tmp_path, "a.ts", mpegts(stream_type, es, pts=(90_000, 90_000 + 120 * 90_000)))
+    size = {TS_STREAM_H264: (1920, 1080), TS_STREAM_HEVC: (1280, 720), TS_STREAM_MPEG2: (720, 576)}[stream_type]
+    assert probe_mpegts(path) == (2, *size)
+
+
+def test_mpegts_192_byte_packets(tmp_path: Path) -> None:
+    data = mpegts(TS_STREAM_H264, h264_es(1280, 720), pts=(0, 180 * 90_000), packet_size=192)
+    assert probe_mpegts(write(tmp_path, "a.ts", data)) == (3, 1280, 720)
+
+
+def test_mpegts_pts_wraparound(tmp_path: Path) -> None:
+    first = TS_TIMESTAMP_WRAP - 30 * 90_000
+    data = mpegts(TS_STREAM_H264, h264_es(1920, 1080), pts=(first, (first + 120 * 90_000) % TS_TIMESTAMP_WRAP))
+    assert probe_mpegts(write(tmp_path, "a.ts", data)) == (2, 1920, 1080)
+
+
+def test_mpegts_pcr_without_pts(tmp_path: Path) -> None:
+    data = mpegts(TS_STREAM_MPEG2, mpeg2_es(720, 480), pts=(None, None), pcr=(27_000, 27_000 + 60 * 90_000))
+    assert probe_mpegts(write(tmp_path, "a.ts", data)) == (1, 720, 480)
+
+
+@pytest.mark.parametrize(
+    ("padding", "ticks"),
+    [
+        (0, 120 * 90_000),  # a few hundred bytes claiming two minutes
+        (2000, 90),  # 376 KB claiming a millisecond
+    ],
+)
+def test_mpegts_implausible_bitrate(tmp_path: Path, padding: int, ticks: int) -> None:
+    path = write(tmp_path, "a.ts", mpegts(TS_STREAM_H264, h264_es(1920, 1080), pts=(0, ticks), padding=padding))
+    assert probe_mpegts(path) is None
+    assert probe_header(path) is None
+
+
+# ASF
+
+
+def asf_object(guid: bytes, body: bytes) -> bytes:
+    return guid + struct.pack("<Q", 24 + len(body)) + body
+
+
+def asf(play_seconds: float, preroll_ms: int, width: int, height: int, flags: int = 0x2) -> bytes:
+    file_properties = asf_object(
+        ASF_FILE_PROPERTIES,
+        b"\0" * 40 + struct.pack("<QQQIIII", int(play_seconds * 10_000_000), 0, preroll_ms, flags, 0, 0, 0),
+    )
+    bitmap_info = struct.pack("<Iii", 40, width, height) + b"\0" * 28
+    specific = struct.pack("<IIBH", width, height, 2, len(bitmap_info)) + bitmap_info
+    stream_properties = asf_object(
+        ASF_STREAM_PROPERTIES,
+        ASF_VIDEO_MEDIA + b"\0" * 16 + struct.pack("<QIIHI", 0, len(specific), 0, 1, 0) + specific,
+    )
+    objects = file_properties + stream_properties
+    return ASF_HEADER + struct.pack("<QIBB", 30 + len(objects), 2, 1, 2) + objects
+
+
+def test_asf(tmp_path: Path) -> None:
+    assert probe_asf(write(tmp_path, "a.wmv", asf(60 * 60 + 3, 3000, 1280, 720))) == (60, 1280, 720)
+
+
+def test_asf_broadcast(tmp_path: Path) -> None:
+    assert probe_asf(write(tmp_path, "a.wmv", asf(600, 0, 1280, 720, flags=0x1))) is None
+
+
+# Dispatch
+
+
+@pytest.mark.parametrize("name", ["a.mp4", "a.mkv", "a.avi", "a.flv", "a.ts", "a.wmv"])
+def test_probe_header_falls_back_on_garbage(tmp_path: Path, name: str) -> None:
+    assert probe_header(write(tmp_path, name, b"\xff" * 4096)) is None
+
+
+def test_probe_header_dispatches_case_insensitively(tmp_path: Path) -> None:
+    assert probe_header(write(tmp_path, "A.MP4", mp4(600, 600 * 95, 320, 240))) == (2, 320, 240)
@@ -0,0 +1,83 @@
+"""Tests for --plan-out plan files and their revalidation by --apply-plan."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from rename_videos import load_plan_file, write_plan_file
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def make_plan(folder: Path) -> list[tuple[Path, Path | None, str]]:
+    folder.mkdir()
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        (folder / name).write_text(name)
+    return [
+        (folder / "a.mp4", folder / "a_640x360.mp4", "RENAME"),
+        (folder / "b.mp4", folder / "b_640x360.mp4", "RENAME"),
+        (folder / "c.mp4", None, "SKIP (probe failed)"),
+        (folder / "gone.mp4", folder / "gone_640x360.mp4", "RENAME"),
+    ]
+
+
+def statuses(plan: list[tuple[Path, Path | None, str]]) -> dict[str, str]:
+    return {old.name: status for old, _, status in plan}
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    plan = make_plan(tmp_path / "videos")
+    path = tmp_path / "plan.jsonl"
+    # Only renames whose source still exists are saved.
+    assert write_plan_file(path, plan) == 2
+    assert load_plan_file(path) == plan[:2]
+
+
+def test_changed_sources_are_skipped(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    path = tmp_path / "plan.jsonl"
+    write_plan_file(path, make_plan(folder))
+
+    # a.mp4 is replaced by another file with the same size and mtime; b.mp4 vanishes.
+    st = (folder / "a.mp4").stat()
+    (folder / "new.tmp").write_text("A.mp4")
+    os.utime(folder / "new.tmp", ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(folder / "new.tmp", folder / "a.mp4")
+    (folder / "b.mp4").unlink()
+    assert statuses(load_plan_file(path)) == {"a.mp4": "SKIP (changed)", "b.mp4": "SKIP (changed)"}
+
+
+def test_modified_source_is_skipped(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    path = tmp_path / "plan.jsonl"
+    write_plan_file(path, make_plan(folder))
+    with open(folder / "b.mp4", "a") as f:
+        f.write("more")
+    assert statuses(load_plan_file(path)) == {"a.mp4": "RENAME", "b.mp4": "SKIP (changed)"}
+
+
+def test_rejects_other_files(tmp_path: Path) -> None:
+    path = tmp_path / "journal.jsonl"
+    path.write_text(json.dumps({"journal": 1}) + "\n")
+    with pytest.raises(ValueError):
+        load_plan_file(path)
+
+
+def test_apply_plan(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    path = tmp_path / "plan.jsonl"
+    write_plan_file(path, make_plan(folder))
+    # A file that appeared at b's target since the dry run is not overwritten.
+    (folder / "b_640x360.mp4").write_text("new")
+    subprocess.run(
+        [sys.executable, str(REPO / "rename_videos.py"), "--apply-plan", str(path)]
+        + ["--journal", str(tmp_path / "journal.jsonl")],
+        capture_output=True,
+        check=True,
+    )
+    assert sorted(p.name for p in folder.iterdir()) == ["a_640x360.mp4", "b.mp4", "b_640x360.mp4", "c.mp4"]
+    assert (folder / "b_640x360.mp4").read_text() == "new"
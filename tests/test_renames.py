@@ -0,0 +1,88 @@
+"""Tests for planning and ordering renames on real directory trees."""
+
+from pathlib import Path
+
+from rename_videos import apply_renames, order_renames, resolve_collisions
+
+# Two files swapping names, plus a chain c -> d -> e.
+CONTENTS = {"a.mp4": "A", "b.mp4": "B", "c.mp4": "C", "d.mp4": "D"}
+RENAMES = {"a.mp4": "b.mp4", "b.mp4": "a.mp4", "c.mp4": "d.mp4", "d.mp4": "e.mp4"}
+EXPECTED = {"a.mp4": "B", "b.mp4": "A", "d.mp4": "C", "e.mp4": "D"}
+
+
+def make_tree(folder: Path) -> list[tuple[Path, Path | None, str]]:
+    for name, content in CONTENTS.items():
+        (folder / name).write_text(content)
+    return resolve_collisions([(folder / old, folder / new, "RENAME") for old, new in RENAMES.items()])
+
+
+def read_tree(folder: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in folder.iterdir() if path.name != ".videoname.json"}
+
+
+def test_order_renames_swap_and_chain(tmp_path: Path) -> None:
+    plan = make_tree(tmp_path)
+    assert [status for _, _, status in plan] == ["RENAME"] * 4
+
+    steps = order_renames(plan)
+    # One extra step parks a member of the swap under a temporary name.
+    assert len(steps) == 5
+    assert sum(1 for *_, final in steps if not final) == 1
+
+    renamed, failed = apply_renames(steps)
+    assert (renamed, failed) == (4, 0)
+    assert read_tree(tmp_path) == EXPECTED
+
+
+def test_order_renames_longer_cycle(tmp_path: Path) -> None:
+    names = ["a.mp4", "b.mp4", "c.mp4"]
+    for name in names:
+        (tmp_path / name).write_text(name)
+    plan = [(tmp_path / old, tmp_path / new, "RENAME") for old, new in zip(names, names[1:] + names[:1])]
+
+    renamed, failed = apply_renames(order_renames(resolve_collisions(plan)))
+    assert (renamed, failed) == (3, 0)
+    assert read_tree(tmp_path) == {"b.mp4": "a.mp4", "c.mp4": "b.mp4", "a.mp4": "c.mp4"}
+
+
+def statuses(folder: Path, renames: dict[str, str]) -> list[str]:
+    plan = resolve_collisions([(folder / old, folder / new, "RENAME") for old, new in renames.items()])
+    return [status for _, _, status in plan]
+
+
+def test_collision_first_source_wins(tmp_path: Path) -> None:
+    for name in ("a.mp4", "b.mp4"):
+        (tmp_path / name).write_text(name)
+    renames = {"a.mp4": "x_640x360.mp4", "b.mp4": "x_640x360.mp4"}
+    assert statuses(tmp_path, renames) == ["RENAME", "SKIP (collision)"]
+
+
+def test_collision_ignores_case(tmp_path: Path) -> None:
+    # Distinct files on a case-sensitive disk, one file on SMB or exFAT once renamed.
+    (tmp_path / "A.mp4").write_text("lower")
+    (tmp_path / "A.MP4").write_text("upper")
+    renames = {"A.mp4": "A_640x360.mp4", "A.MP4": "A_640x360.MP4"}
+    assert statuses(tmp_path, renames) == ["RENAME", "SKIP (collision)"]
+
+
+def test_collision_with_a_file_that_stays(tmp_path: Path) -> None:
+    (tmp_path / "a.mp4").write_text("A")
+    (tmp_path / "B.MP4").write_text("B")
+    plan = resolve_collisions([(tmp_path / "a.mp4", tmp_path / "b.mp4", "RENAME")])
+    assert plan[0][2] == "SKIP (target exists)"
+    assert order_renames(plan) == []
+
+
+def test_target_that_moves_away_is_free(tmp_path: Path) -> None:
+    for name in ("a.mp4", "b.mp4"):
+        (tmp_path / name).write_text(name)
+    assert statuses(tmp_path, {"a.mp4": "b.mp4", "b.mp4": "c.mp4"}) == ["RENAME", "RENAME"]
+
+
+def test_skipped_rename_blocks_its_dependents(tmp_path: Path) -> None:
+    # c stays, so b cannot move onto it, so a cannot move onto b.
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        (tmp_path / name).write_text(name)
+    renames = {"a.mp4": "b.mp4", "b.mp4": "c.mp4"}
+    assert statuses(tmp_path, renames) == ["SKIP (target exists)", "SKIP (target exists)"]
+    assert read_tree(tmp_path) == {"a.mp4": "a.mp4", "b.mp4": "b.mp4", "c.mp4": "c.mp4"}
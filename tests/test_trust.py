@@ -0,0 +1,102 @@
+"""Tests for --trust-names and the rename stamps it relies on."""
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+import rename_videos
+from rename_videos import (
+    STAMP_SIDECAR,
+    clear_name_stamps,
+    name_is_stamped,
+    probe_file_entry,
+    trusted_name,
+    write_name_stamps,
+)
+
+
+def make(folder: Path, name: str) -> Path:
+    path = folder / name
+    path.write_bytes(b"\0" * 64)
+    return path
+
+
+@pytest.fixture
+def no_xattrs(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Make every xattr call fail as on a filesystem without user xattrs."""
+
+    def unsupported(*args: object) -> None:
+        raise OSError(errno.ENOTSUP, "Operation not supported")
+
+    for name in ("getxattr", "setxattr", "removexattr"):
+        monkeypatch.setattr(rename_videos.os, name, unsupported, raising=False)
+
+
+def test_off_trusts_nothing(tmp_path: Path) -> None:
+    path = make(tmp_path, "movie_1920x1080.mp4")
+    write_name_stamps([path], sidecar=True)
+    assert not trusted_name(path, "off")
+
+
+def test_resolution_trusts_any_resolution_suffix(tmp_path: Path) -> None:
+    assert trusted_name(make(tmp_path, "movie_1920x1080.mp4"), "resolution")
+    assert not trusted_name(make(tmp_path, "movie.mp4"), "resolution")
+    assert not trusted_name(make(tmp_path, "movie_1920x1080_extra.mp4"), "resolution")
+
+
+@pytest.mark.parametrize("trust", ["tagged", "resolution"])
+def test_chinese_duration_label_is_never_trusted(tmp_path: Path, trust: str) -> None:
+    path = make(tmp_path, "电影_120分钟_1920x1080.mkv")
+    write_name_stamps([path], sidecar=True)
+    assert not trusted_name(path, trust)
+
+
+def test_tagged_needs_a_matching_stamp(tmp_path: Path) -> None:
+    path = make(tmp_path, "movie_1920x1080.mp4")
+    assert not trusted_name(path, "tagged")
+
+    write_name_stamps([path], sidecar=True)
+    assert trusted_name(path, "tagged")
+
+    # Any change to the file invalidates the stamp.
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert not trusted_name(path, "tagged")
+
+
+def test_clear_name_stamps(tmp_path: Path) -> None:
+    path = make(tmp_path, "movie_1920x1080.mp4")
+    write_name_stamps([path])
+    if not name_is_stamped(path):
+        pytest.skip("no user xattrs on this filesystem")
+    clear_name_stamps([path])
+    assert not name_is_stamped(path)
+
+
+def test_sidecar_fallback(tmp_path: Path, no_xattrs: None) -> None:
+    first = make(tmp_path, "first_1920x1080.mp4")
+    second = make(tmp_path, "second_1280x720.mp4")
+
+    write_name_stamps([first])
+    assert not (tmp_path / STAMP_SIDECAR).exists()
+    assert not name_is_stamped(first)
+
+    write_name_stamps([first], sidecar=True)
+    write_name_stamps([second], sidecar=True)
+    # Later writes merge with the stamps already in the sidecar.
+    assert name_is_stamped(first)
+    assert name_is_stamped(second)
+    assert trusted_name(second, "tagged")
+
+    os.utime(second, ns=(0, second.stat().st_mtime_ns + 1_000_000_000))
+    assert not name_is_stamped(second)
+
+
+def test_probe_file_entry_skips_trusted_names(tmp_path: Path) -> None:
+    path = make(tmp_path, "movie_1920x1080.mp4")
+    # A trusted name must not reach ffprobe, so a missing binary is fine.
+    entry, probe_result = probe_file_entry("/nonexistent/ffprobe", path, trust="resolution")
+    assert entry == (path, None, "SKIP (already named)")
+    assert probe_result is None
@@ -0,0 +1,58 @@
+"""Tests for --watch mode."""
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from test_parsers import mp4
+
+REPO = Path(__file__).resolve().parent.parent
+FAKE_FFPROBE = REPO / "benchmarks" / "fake_ffprobe.py"
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="--watch needs inotify")
+
+
+def watch_once(tmp_path: Path, folder: Path, journal: Path, sample: Path, name: str) -> None:
+    """Run --watch --apply until the sample copied in as name has been renamed, then stop it."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir(exist_ok=True)
+    if not (bin_dir / "ffprobe").exists():
+        (bin_dir / "ffprobe").symlink_to(FAKE_FFPROBE)
+    env = dict(os.environ, PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    proc = subprocess.Popen(
+        [sys.executable, str(REPO / "rename_videos.py"), str(folder), "--watch", "--apply", "--debounce", "0.2",
+         "--no-cache", "--journal", str(journal)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=lambda: signal.signal(signal.SIGINT, signal.SIG_DFL),
+    )
+    try:
+        time.sleep(1)
+        shutil.copy(sample, folder / name)
+        renamed = folder / name.replace(".mp4", "_640x360.mp4")
+        deadline = time.monotonic() + 15
+        while not renamed.exists() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert renamed.exists()
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait(timeout=10)
+
+
+def test_restarted_session_continues_journal_numbers(tmp_path: Path) -> None:
+    folder = tmp_path / "videos"
+    folder.mkdir()
+    sample = tmp_path / "sample.mp4"
+    sample.write_bytes(mp4(1000, 10 * 60 * 1000, 640, 360))
+    journal = tmp_path / "journals" / "watch.jsonl"
+
+    watch_once(tmp_path, folder, journal, sample, "first.mp4")
+    watch_once(tmp_path, folder, journal, sample, "second.mp4")
+    assert sorted(p.name for p in journal.parent.iterdir()) == ["watch-1.jsonl", "watch-2.jsonl"]
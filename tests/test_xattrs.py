@@ -0,0 +1,46 @@
+"""Tests for probe results kept in user.videoname.* extended attributes."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from rename_videos import XATTR_RENAMED, XattrCache, name_is_stamped, trusted_name, write_name_stamps
+
+
+@pytest.fixture
+def video(tmp_path: Path) -> Path:
+    path = tmp_path / "电影_120分钟_1920x1080.mkv"
+    path.write_bytes(b"\0" * 64)
+    try:
+        os.setxattr(path, "user.test", b"1")
+    except (OSError, AttributeError):
+        pytest.skip("no user xattrs on this filesystem")
+    os.removexattr(path, "user.test")
+    return path
+
+
+def test_round_trip(video: Path) -> None:
+    cache = XattrCache()
+    cache.put(video, video.stat(), (95, 1920, 1080))
+    assert cache.get(video, video.stat()) == (95, 1920, 1080)
+    assert (cache.hits, cache.written) == (1, 1)
+
+
+def test_stale_after_modification(video: Path) -> None:
+    cache = XattrCache()
+    cache.put(video, video.stat(), (95, 1920, 1080))
+    with open(video, "ab") as f:
+        f.write(b"more")
+    os.utime(video, ns=(0, video.stat().st_mtime_ns + 1_000_000_000))
+    assert cache.get(video, video.stat()) is None
+
+
+def test_probe_results_are_not_a_rename_stamp(video: Path) -> None:
+    XattrCache().put(video, video.stat(), (95, 1920, 1080))
+    assert not name_is_stamped(video)
+    assert not trusted_name(video, "tagged")
+
+    write_name_stamps([video])
+    assert XATTR_RENAMED in os.listxattr(video)
+    assert name_is_stamped(video)